@@ -5,7 +5,7 @@ import json
 import warnings
 
 import six
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
 from django.core.serializers.json import DjangoJSONEncoder
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
@@ -26,11 +26,17 @@ class ActionRegistry(object):
         for k, f in sorted(six.iteritems(self._actions)):
             yield k, f.label
 
-    def register(self, func, label):
+    def register(self, func, label, takes_context=False, batch=None):
         if not callable(func):
             raise ValueError('%r must be a callable' % func)
-
-        if is_old_style_action(func):
+        if batch is not None and not callable(batch):
+            raise ValueError('%r must be a callable' % batch)
+
+        if batch is not None:
+            func.batch = batch
+        if takes_context:
+            func.takes_context = True
+        elif is_old_style_action(func):
             warnings.warn('The formmodel action "%s" is missing the third '
                           'argument "request". You should update your code to '
                           'match action(form_model, form, request).' % label,
@@ -48,29 +54,27 @@ class ActionRegistry(object):
 action_registry = ActionRegistry()
 
 
-def formmodel_action(label):
+def formmodel_action(label, takes_context=False, batch=None):
+    """
+    Registers the decorated function as a form action. If ``takes_context``
+    is ``True`` the action is called with a
+    :class:`~dynamic_forms.submission.SubmissionContext` as its only argument
+    instead of ``(form_model, form, request)``. ``batch`` is an optional
+    function handling many submissions at once, see
+    :meth:`~dynamic_forms.submission.SubmissionContext.run_batch_actions`.
+    """
     def decorator(func):
-        action_registry.register(func, label)
+        action_registry.register(func, label, takes_context=takes_context,
+            batch=batch)
         return func
     return decorator
 
 
-@formmodel_action(_('Send via email'))
-def dynamic_form_send_email(form_model, form, request):
+def _get_email_message(form_model, form):
     mapped_data = form.get_mapped_data()
-    mapped_items = mapped_data.items()
-    field_labels = []
-    fields = form_model.fields.all()
-    for field in fields:
-        if field.field_type in ('dynamic_forms.formfields.StartGroupField',
-                                'dynamic_forms.formfields.EndGroupField'):
-            continue
-        field_labels.append(field.label)
-    items_list = []
-    for label in field_labels:
-        for item in mapped_items:
-            if item[0] == label:
-                items_list.append(item)
+    items_list = [(field.label, mapped_data[field.label])
+                  for field in form.schema.data_fields
+                  if field.label in mapped_data]
 
     subject = _('Form “%(formname)s” submitted') % {'formname': form_model}
     message = render_to_string('dynamic_forms/email.txt', {
@@ -82,10 +86,55 @@ def dynamic_form_send_email(form_model, form, request):
         recipient_list = [form_model.recipient_email]
     else:
         recipient_list = settings.DYNAMIC_FORMS_EMAIL_RECIPIENTS
-    send_mail(subject, message, from_email, recipient_list)
+    return subject, message, from_email, recipient_list
+
+
+def dynamic_form_send_email_batch(context, forms):
+    # All mails are sent over a single connection
+    send_mass_mail([_get_email_message(context.form_model, form)
+                    for form in forms])
+    return [None] * len(forms)
+
 
+# Sent mails cannot be taken back if a later action fails
+dynamic_form_send_email_batch.run_last = True
 
-@formmodel_action(_('Store in database'))
+
+@formmodel_action(_('Send via email'), batch=dynamic_form_send_email_batch)
+def dynamic_form_send_email(form_model, form, request):
+    send_mail(*_get_email_message(form_model, form))
+
+
+def dynamic_form_store_database_batch(context, forms):
+    from dynamic_forms.models import FormModelData
+    form_model = context.form_model
+    data_sets = [FormModelData(form=form_model,
+        value=json.dumps(form.get_mapped_data(), cls=DjangoJSONEncoder))
+        for form in forms]
+    if not form_model.allow_display:
+        # Without display keys, the rows of a bulk INSERT cannot be told
+        # apart to look up their primary keys.
+        for data in data_sets:
+            data.save()
+        return data_sets
+    keys = FormModelData.generate_display_keys(len(data_sets))
+    for data, key in zip(data_sets, keys):
+        data.display_key = key
+    FormModelData.objects.bulk_create(data_sets)
+    if data_sets and data_sets[0].pk is None:
+        # Most databases do not return the primary keys of a bulk INSERT
+        pks = {}
+        for i in range(0, len(keys), 500):
+            pks.update(FormModelData.objects.filter(
+                display_key__in=keys[i:i + 500]).values_list('display_key',
+                'pk'))
+        for data in data_sets:
+            data.pk = pks[data.display_key]
+    return data_sets
+
+
+@formmodel_action(_('Store in database'),
+    batch=dynamic_form_store_database_batch)
 def dynamic_form_store_database(form_model, form, request):
     from dynamic_forms.models import FormModelData
     mapped_data = form.get_mapped_data()
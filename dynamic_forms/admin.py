@@ -16,7 +16,10 @@ from django.utils.translation import ugettext_lazy as _
 from suit.admin import SortableStackedInline
 
 from dynamic_forms.formfields import formfield_registry
-from dynamic_forms.models import FormFieldModel, FormModel, FormModelData
+from dynamic_forms.models import (
+    ChoiceSet, FormFieldModel, FormModel, FormModelData, defer_schema_changes,
+)
+from dynamic_forms.schema import get_form_schema
 from dynamic_forms.utils import export_as_csv_action
 
 
@@ -177,9 +180,30 @@ class FormModelAdmin(admin.ModelAdmin):
     model = FormModel
     actions = [export_as_csv_action("Export form submissions as CSV")]
 
+    def changeform_view(self, *args, **kwargs):
+        # The form and all its inline fields get a single new schema version
+        with defer_schema_changes():
+            return super(FormModelAdmin, self).changeform_view(*args,
+                **kwargs)
+
+    def changelist_view(self, *args, **kwargs):
+        # Deleting selected forms also deletes their fields
+        with defer_schema_changes():
+            return super(FormModelAdmin, self).changelist_view(*args,
+                **kwargs)
+
 admin.site.register(FormModel, FormModelAdmin)
 
 
+class ChoiceSetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'version')
+    model = ChoiceSet
+    search_fields = ('name',)
+
+
+admin.site.register(ChoiceSet, ChoiceSetAdmin)
+
+
 class FormFilter(SimpleListFilter):
     title = 'Selected Form'
     parameter_name = 'form'
@@ -211,11 +235,7 @@ class FormModelDataAdmin(admin.ModelAdmin):
             list_display_tuple = ['form', 'submitted']
             form_obj = FormModel.objects.get(pk=int(request.GET.get('form')))
             self.form_obj = form_obj
-            fields = form_obj.fields.all()
-            for field in fields:
-                if field.field_type in ('dynamic_forms.formfields.StartGroupField',
-                                        'dynamic_forms.formfields.EndGroupField'):
-                    continue
+            for field in get_form_schema(form_obj).data_fields:
                 field_slug = slugify(field.name).replace('-', '_')
                 list_display_tuple.append("get_form_data_value_for_%s" % field_slug)
                 self.add_form_value_display(field.label, field_slug)
@@ -2,9 +2,38 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import ugettext_lazy as _
 
 
 class DynamicFormsConfig(AppConfig):
     name = 'dynamic_forms'
     verbose_name = _("Dynamic Forms")
+
+    def ready(self):
+        from dynamic_forms import cache, checks, prerender  # NOQA
+        from dynamic_forms.models import (
+            FormFieldModel, FormModel, form_field_model_changed,
+            form_model_deleted, form_model_saved,
+        )
+        from dynamic_forms.schema import schema_changed_receiver
+        from dynamic_forms.signals import schema_changed
+
+        post_save.connect(form_model_saved, sender=FormModel,
+            dispatch_uid='dynamic_forms_form_model_saved')
+        post_delete.connect(form_model_deleted, sender=FormModel,
+            dispatch_uid='dynamic_forms_form_model_deleted')
+        for signal in (post_save, post_delete):
+            signal.connect(form_field_model_changed, sender=FormFieldModel,
+                dispatch_uid='dynamic_forms_form_field_model_changed')
+        schema_changed.connect(schema_changed_receiver,
+            dispatch_uid='dynamic_forms_schema_cache')
+        schema_changed.connect(cache.schema_changed_receiver,
+            dispatch_uid='dynamic_forms_form_model_cache')
+        schema_changed.connect(prerender.schema_changed_receiver,
+            dispatch_uid='dynamic_forms_prerender')
+        request_started.connect(prerender.request_started_receiver,
+            dispatch_uid='dynamic_forms_prerender')
+        request_finished.connect(prerender.request_finished_receiver,
+            dispatch_uid='dynamic_forms_prerender')
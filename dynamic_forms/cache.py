@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import calendar
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+from dynamic_forms.conf import settings
+
+
+class LRUCache(object):
+    """
+    A thread-safe, per-process cache holding at most ``maxsize`` entries for
+    at most ``ttl`` seconds each. The least recently used entry is dropped
+    first. A ``maxsize`` or ``ttl`` of ``0`` disables the cache.
+    """
+
+    def __init__(self, maxsize=128, ttl=60, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires <= self.timer():
+                return default
+            self._data[key] = (expires, value)  # Mark as recently used
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize or not self.ttl:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (self.timer() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+form_model_cache = LRUCache(
+    maxsize=settings.DYNAMIC_FORMS_FORM_MODEL_CACHE_SIZE,
+    ttl=settings.DYNAMIC_FORMS_FORM_MODEL_CACHE_TTL,
+)
+
+
+# Stands in for a form that does not exist in the form_model_cache
+_MISSING = object()
+
+
+def get_form_model(form_id, cache_missing=False):
+    """
+    Returns the :class:`~dynamic_forms.models.FormModel` with the primary key
+    ``form_id`` from the per-process :data:`form_model_cache`, loading it from
+    the database if necessary. Raises ``FormModel.DoesNotExist`` if there is
+    no such form; with ``cache_missing=True`` that is cached as well.
+
+    The returned instance is shared between requests and must not be
+    modified.
+    """
+    from dynamic_forms.models import FormModel
+    form_id = int(form_id)
+    form_model = form_model_cache.get(form_id)
+    if form_model is _MISSING:
+        raise FormModel.DoesNotExist(
+            'FormModel matching query does not exist.')
+    if form_model is None:
+        try:
+            form_model = FormModel.objects.get(pk=form_id)
+        except FormModel.DoesNotExist:
+            if cache_missing:
+                form_model_cache.set(form_id, _MISSING)
+            raise
+        form_model_cache.set(form_id, form_model)
+    return form_model
+
+
+def schema_changed_receiver(sender, form_id, **kwargs):
+    form_model_cache.delete(form_id)
+
+
+def get_cache():
+    """
+    Returns the Django cache configured by
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_CACHE`, which is shared by all
+    processes.
+    """
+    return caches[settings.DYNAMIC_FORMS_CACHE]
+
+
+def get_form_cache_key(prefix, form_model, *parts):
+    """
+    Returns a key for a value derived from the current schema of
+    ``form_model``. The key contains the form's id, schema version and schema
+    modification time, so a changed form never matches an old entry. Any
+    further ``parts`` are hashed into the key.
+    """
+    modified_at = form_model.schema_modified_at
+    key = 'dynamic_forms:%s:%d:%d:%d.%06d' % (prefix, form_model.pk,
+        form_model.schema_version,
+        calendar.timegm(modified_at.utctimetuple()), modified_at.microsecond)
+    if parts:
+        digest = hashlib.md5(force_bytes('\x00'.join(parts))).hexdigest()
+        key = '%s:%s' % (key, digest)
+    return key
+
+
+def single_flight(key, build, timeout, stale_timeout=None, cache=None):
+    """
+    Returns the value cached under ``key``, calling ``build()`` to create and
+    cache it if it is missing or older than ``timeout`` seconds.
+
+    Only one caller at a time builds a value for a given key, across threads
+    and processes: the builder holds a lock acquired with the atomic
+    ``cache.add()``. Other callers return the previous value while it is not
+    older than ``timeout + stale_timeout`` seconds, or else wait up to
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT` seconds for
+    the builder to finish. If the builder takes longer than that, the waiting
+    caller builds the value itself rather than failing.
+    """
+    if cache is None:
+        cache = get_cache()
+    if stale_timeout is None:
+        stale_timeout = settings.DYNAMIC_FORMS_STALE_TIMEOUT
+    lock_timeout = settings.DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT
+    lock_key = '%s:lock' % key
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+
+    deadline = time.time() + lock_timeout
+    while True:
+        if cache.add(lock_key, 1, lock_timeout):
+            try:
+                return _build_and_set(cache, key, build, timeout,
+                    stale_timeout)
+            finally:
+                cache.delete(lock_key)
+        if entry is not None:
+            # Serve stale while somebody else rebuilds the value
+            return entry[1]
+        if time.time() >= deadline:
+            # The builder seems to be stuck or gone, don't wait any longer
+            return _build_and_set(cache, key, build, timeout, stale_timeout)
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+
+
+def _build_and_set(cache, key, build, timeout, stale_timeout):
+    value = build()
+    cache.set(key, (time.time() + timeout, value), timeout + stale_timeout)
+    return value
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core import checks
+
+from dynamic_forms.formfields import formfield_registry
+
+
+@checks.register('dynamic_forms')
+def check_formfield_registry(app_configs=None, **kwargs):
+    """
+    Resolves the field and widget classes of all registered dynamic form
+    fields at startup instead of on the first request.
+    """
+    return [
+        checks.Error(
+            '%s' % e,
+            hint='Check the "cls" and "widget" attributes of %s.' % key,
+            obj=formfield_registry.get(key),
+            id='dynamic_forms.E001',
+        )
+        for key, e in formfield_registry.resolve_all()
+    ]
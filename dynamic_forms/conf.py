@@ -23,3 +23,87 @@ settings.DYNAMIC_FORMS_SUCCESS_TEMPLATES = getattr(
         ('dynamic_forms/form_success.html', _('Default success template')),
     ]
 )
+
+settings.DYNAMIC_FORMS_AUTOCOMPLETE_PAGE_SIZE = getattr(
+    settings,
+    'DYNAMIC_FORMS_AUTOCOMPLETE_PAGE_SIZE',
+    20
+)
+
+settings.DYNAMIC_FORMS_FORM_MODEL_CACHE_SIZE = getattr(
+    settings,
+    'DYNAMIC_FORMS_FORM_MODEL_CACHE_SIZE',
+    128
+)
+
+settings.DYNAMIC_FORMS_FORM_MODEL_CACHE_TTL = getattr(
+    settings,
+    'DYNAMIC_FORMS_FORM_MODEL_CACHE_TTL',
+    60
+)
+
+settings.DYNAMIC_FORMS_CACHE = getattr(
+    settings,
+    'DYNAMIC_FORMS_CACHE',
+    'default'
+)
+
+settings.DYNAMIC_FORMS_SCHEMA_CACHE_TIMEOUT = getattr(
+    settings,
+    'DYNAMIC_FORMS_SCHEMA_CACHE_TIMEOUT',
+    24 * 60 * 60
+)
+
+settings.DYNAMIC_FORMS_STALE_TIMEOUT = getattr(
+    settings,
+    'DYNAMIC_FORMS_STALE_TIMEOUT',
+    60
+)
+
+settings.DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT = getattr(
+    settings,
+    'DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT',
+    10
+)
+
+settings.DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT = getattr(
+    settings,
+    'DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT',
+    0
+)
+
+settings.DYNAMIC_FORMS_PRERENDER_DIR = getattr(
+    settings,
+    'DYNAMIC_FORMS_PRERENDER_DIR',
+    None
+)
+
+settings.DYNAMIC_FORMS_FORM_TAG_CACHE_SIZE = getattr(
+    settings,
+    'DYNAMIC_FORMS_FORM_TAG_CACHE_SIZE',
+    128
+)
+
+settings.DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT = getattr(
+    settings,
+    'DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT',
+    60 * 60
+)
+
+settings.DYNAMIC_FORMS_SCHEMA_MAX_AGE = getattr(
+    settings,
+    'DYNAMIC_FORMS_SCHEMA_MAX_AGE',
+    5 * 60
+)
+
+settings.DYNAMIC_FORMS_BATCH_MAX_SIZE = getattr(
+    settings,
+    'DYNAMIC_FORMS_BATCH_MAX_SIZE',
+    1000
+)
+
+settings.DYNAMIC_FORMS_JSON_CSRF_EXEMPT = getattr(
+    settings,
+    'DYNAMIC_FORMS_JSON_CSRF_EXEMPT',
+    False
+)
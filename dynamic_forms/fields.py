@@ -2,16 +2,26 @@
 from __future__ import unicode_literals
 
 import six
+from django import VERSION
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.forms import CheckboxSelectMultiple
+from django.utils.encoding import force_text
 from django.utils.text import capfirst
 from django import forms
 
+from dynamic_forms.formfields import CompiledChoices
 from dynamic_forms.forms import MultiSelectFormField
 
 
-class TextMultiSelectField(models.TextField):
+if VERSION < (1, 8):
+    # from_db_value() is new in Django 1.8
+    TextFieldBase = six.with_metaclass(models.SubfieldBase, models.TextField)
+else:
+    TextFieldBase = models.TextField
+
+
+class TextMultiSelectField(TextFieldBase):
     # http://djangosnippets.org/snippets/2753/
 
     widget = CheckboxSelectMultiple
@@ -72,6 +82,9 @@ class TextMultiSelectField(models.TextField):
     def get_prep_value(self, value):
         return value
 
+    def from_db_value(self, value, expression, connection, context):
+        return self.to_python(value)
+
     def to_python(self, value):
         if value is not None:
             return (value if isinstance(value, list) else
@@ -103,3 +116,58 @@ class StartGroupField(forms.CharField):
 class EndGroupField(forms.CharField):
     def clean(self, value):
         return "END"
+
+
+class IndexedChoiceField(forms.ChoiceField):
+    """
+    A :class:`~django.forms.ChoiceField` for large choice lists. The choices
+    are kept as an immutable tuple that is shared between copies of the field
+    and values are validated against a ``frozenset``.
+
+    ``choices`` may be given as a
+    :class:`~dynamic_forms.formfields.CompiledChoices` instance to reuse its
+    tuple and set.
+    """
+
+    def __deepcopy__(self, memo):
+        # Skip ChoiceField.__deepcopy__, which copies the choices
+        return forms.Field.__deepcopy__(self, memo)
+
+    def _set_choices(self, value):
+        if isinstance(value, CompiledChoices):
+            choices, values = value.choices, value.values
+        else:
+            choices = tuple(value)
+            values = set()
+            for key, label in choices:
+                if isinstance(label, (list, tuple)):
+                    # An optgroup
+                    values.update(force_text(k) for k, v in label)
+                else:
+                    values.add(force_text(key))
+            values = frozenset(values)
+        self._choices = self.widget.choices = choices
+        self.valid_values = values
+
+    choices = property(forms.ChoiceField._get_choices, _set_choices)
+
+    def valid_value(self, value):
+        return force_text(value) in self.valid_values
+
+
+class AutocompleteWidget(forms.TextInput):
+    """
+    A text input for choice fields that does not render its choices. The URL
+    to look up matching choices is given in the ``data-autocomplete-url``
+    attribute.
+    """
+
+    def __init__(self, attrs=None):
+        default_attrs = {'autocomplete': 'off'}
+        if attrs:
+            default_attrs.update(attrs)
+        super(AutocompleteWidget, self).__init__(default_attrs)
+
+
+class AutocompleteChoiceField(IndexedChoiceField):
+    widget = AutocompleteWidget
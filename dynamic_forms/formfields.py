@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-import copy
+import json
 import re
+from bisect import bisect_left
+from collections import namedtuple
 from importlib import import_module
 from django import forms
 
 
 import six
 from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import NoReverseMatch, reverse
 from django.utils.decorators import classonlymethod
-from django.utils.encoding import python_2_unicode_compatible
+from django.utils.encoding import force_text, python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -28,6 +32,63 @@ def load_class_from_string(cls_string):
     return getattr(module, cls)
 
 
+class CompiledChoices(object):
+    """
+    An immutable, parsed choice list: ``choices`` is a tuple of 2-tuples and
+    ``values`` the frozenset of all valid choice keys. Instances are shared by
+    all form fields built from the same choice definition.
+    """
+    __slots__ = ('choices', 'values', '_index')
+
+    blank_choice = ('', '---')
+
+    def __init__(self, choices, blank=True):
+        choices = tuple(choices)
+        self.values = frozenset(force_text(key) for key, label in choices)
+        if blank:
+            choices = (self.blank_choice,) + choices
+        self.choices = choices
+        self._index = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return force_text(value) in self.values
+
+    def search(self, prefix, offset=0, limit=20):
+        """
+        Returns a 2-tuple ``(choices, more)`` with at most ``limit`` choices
+        whose label starts with ``prefix`` (case-insensitive), skipping the
+        first ``offset`` matches. ``more`` tells whether there are more
+        matches. The prefix index is built on first use.
+        """
+        if self._index is None:
+            entries = sorted(
+                (force_text(label).lower(), key, label)
+                for key, label in self.choices if key != ''
+            )
+            self._index = ([e[0] for e in entries], entries)
+        keys, entries = self._index
+        prefix = force_text(prefix).lower()
+        results = []
+        i = bisect_left(keys, prefix) + offset
+        while i < len(keys) and keys[i].startswith(prefix):
+            if len(results) == limit:
+                return results, True
+            results.append(entries[i][1:])
+            i += 1
+        return results, False
+
+    @classmethod
+    def from_text(cls, text, blank=True):
+        """
+        Compiles a choice list from a text with one choice per line. Empty
+        lines are ignored.
+        """
+        return cls(((row, row) for row in text.splitlines() if row), blank)
+
+
 class DynamicFormFieldRegistry(object):
 
     def __init__(self):
@@ -51,6 +112,20 @@ class DynamicFormFieldRegistry(object):
         if key in self._fields:
             del self._fields[key]
 
+    def resolve_all(self):
+        """
+        Resolves the field and widget classes of all registered dynamic form
+        fields. Returns a list of 2-tuples ``(key, exception)`` for those
+        fields that are misconfigured.
+        """
+        errors = []
+        for key, cls in sorted(six.iteritems(self._fields)):
+            try:
+                cls.resolve_classes()
+            except ImproperlyConfigured as e:
+                errors.append((key, e))
+        return errors
+
 
 formfield_registry = DynamicFormFieldRegistry()
 dynamic_form_field_registry = formfield_registry
@@ -65,6 +140,27 @@ def dynamic_form_field(cls):
     return cls
 
 
+class FieldOption(namedtuple('FieldOption', ('type', 'default', 'formfield'))):
+    """
+    The immutable specification of a single option of a dynamic form field:
+    the expected ``type`` of the value, its ``default`` and the ``formfield``
+    used to edit the option in the admin. Shared by all instances of a field
+    type.
+    """
+    __slots__ = ()
+
+
+def _resolve(field_cls, attr):
+    value = getattr(field_cls, attr)
+    if not isinstance(value, six.string_types):
+        return value
+    try:
+        return load_class_from_string(value)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise ImproperlyConfigured('%s.%s: cannot load %s %r: %s' % (
+            field_cls.__module__, field_cls.__name__, attr, value, e))
+
+
 class DFFMetaclass(type):
 
     def __new__(cls, name, bases, attrs):
@@ -87,9 +183,9 @@ class DFFMetaclass(type):
             for k, v in six.iteritems(meta.__dict__):
                 if k.startswith('_') or k in excludes:
                     continue
-                opts[k] = v
+                opts[k] = v if isinstance(v, FieldOption) else FieldOption(*v)
         else:
-            opts = copy.deepcopy(super_opts)
+            opts = dict(super_opts)
         setattr(new_class, '_meta', opts)
         return new_class
 
@@ -101,15 +197,18 @@ class BaseDynamicFormField(six.with_metaclass(DFFMetaclass)):
     display_label = None
     widget = None
 
+    #: The format of valid values checked on the client, if any, e.g.
+    #: ``'email'`` (see :meth:`get_validation_rules`).
+    validation_format = None
+
+    #: Option values given to an instance. Never changed in place but
+    #: replaced by :meth:`set_options`, thus shared until the first write.
+    _overrides = {}
+
     class Meta:
         help_text = [six.string_types, '', (forms.CharField, forms.Textarea)]
         required = [bool, True, forms.NullBooleanField]
 
-    def __new__(cls, *args, **kwargs):
-        self = super(BaseDynamicFormField, cls).__new__(cls)
-        self._meta = copy.deepcopy(self.__class__._meta)
-        return self
-
     def __init__(self, name, label, widget_attrs={}, **kwargs):
         self.name = name
         self.label = label
@@ -128,22 +227,16 @@ class BaseDynamicFormField(six.with_metaclass(DFFMetaclass)):
         }
 
     def construct(self, **kwargs):
-        if isinstance(self.cls, six.string_types):
-            cls_type = load_class_from_string(self.cls)
-        else:
-            cls_type = self.cls
+        cls_type, widget_type = self.__class__.resolve_classes()
 
+        overrides = self._overrides
         f_kwargs = {}
-        for key, val in six.iteritems(self.options):
-            f_kwargs[key] = val[1]
+        for key, option in six.iteritems(self._meta):
+            f_kwargs[key] = overrides.get(key, option.default)
 
         f_kwargs['label'] = self.label
 
-        if self.widget is not None:
-            if isinstance(self.widget, six.string_types):
-                widget_type = load_class_from_string(self.widget)
-            else:
-                widget_type = self.widget
+        if widget_type is not None:
             f_kwargs['widget'] = widget_type(**self.get_widget_attrs())
 
         f_kwargs.update(kwargs)  # Update the field kwargs by those given
@@ -151,7 +244,49 @@ class BaseDynamicFormField(six.with_metaclass(DFFMetaclass)):
         return cls_type(**f_kwargs)
 
     def contribute_to_form(self, form):
-        form.fields[self.name] = self.construct()
+        field = self.construct()
+        rules = self.get_validation_rules()
+        if rules:
+            field.widget.attrs['data-rules'] = json.dumps(rules,
+                separators=(',', ':'), sort_keys=True)
+        form.fields[self.name] = field
+
+    def get_validation_rules(self):
+        """
+        Returns a dictionary of the rules a value must satisfy, for checking
+        it in the browser before the form is submitted: ``required``,
+        ``format`` (see :attr:`validation_format`) and any rules added by
+        subclasses. Rules that do not apply are left out.
+        """
+        rules = {}
+        if 'required' in self._meta and self.get_option('required'):
+            rules['required'] = True
+        if self.validation_format:
+            rules['format'] = self.validation_format
+        return rules
+
+    def _add_option_rules(self, rules, *keys):
+        for key in keys:
+            value = self.get_option(key)
+            if value is not None:
+                rules[key] = value
+        return rules
+
+    @classonlymethod
+    def resolve_classes(cls):
+        """
+        Returns the 2-tuple ``(field class, widget class)`` for :attr:`cls`
+        and :attr:`widget`, loading them if they are given as dotted paths.
+        The result is cached on the class.
+
+        Raises :exc:`~django.core.exceptions.ImproperlyConfigured` if a class
+        cannot be loaded.
+        """
+        resolved = cls.__dict__.get('_resolved_classes')
+        if resolved is None:
+            resolved = (_resolve(cls, 'cls'), _resolve(cls, 'widget'))
+            cls._resolved_classes = resolved
+        return resolved
 
     @classonlymethod
     def get_display_label(cls):
@@ -161,21 +296,39 @@ class BaseDynamicFormField(six.with_metaclass(DFFMetaclass)):
 
     @property
     def options(self):
-        return self._meta
+        """
+        A mapping of all option names to a :class:`FieldOption` whose
+        ``default`` is the value of this instance.
+        """
+        overrides = self._overrides
+        return dict(
+            (key, option._replace(default=overrides[key])
+                if key in overrides else option)
+            for key, option in six.iteritems(self._meta)
+        )
+
+    def get_option(self, key):
+        try:
+            return self._overrides[key]
+        except KeyError:
+            return self._meta[key].default
 
     def get_widget_attrs(self):
         return self.widget_attrs
 
     def set_options(self, **kwargs):
-        for key, value in six.iteritems(kwargs):
-            if key not in self.options:
-                raise KeyError('%s is not a valid option.' % key)
-
-            expected_type = self.options[key][0]
-            if not isinstance(value, expected_type) and value is not None:
-                raise TypeError('Neither of type %r nor None' % expected_type)
-
-            self.options[key][1] = value
+        if kwargs:
+            overrides = dict(self._overrides)
+            for key, value in six.iteritems(kwargs):
+                if key not in self._meta:
+                    raise KeyError('%s is not a valid option.' % key)
+
+                expected_type = self._meta[key].type
+                if not isinstance(value, expected_type) and value is not None:
+                    raise TypeError('Neither of type %r nor None' % expected_type)
+
+                overrides[key] = value
+            self._overrides = overrides
         self.options_valid()
 
     def options_valid(self):
@@ -199,29 +352,83 @@ class BooleanField(BaseDynamicFormField):
 @dynamic_form_field
 class ChoiceField(BaseDynamicFormField):
 
-    cls = 'django.forms.ChoiceField'
+    cls = 'dynamic_forms.fields.IndexedChoiceField'
     display_label = _('Choices')
 
     class Meta:
         choices = [six.string_types, '', (forms.CharField, forms.Textarea)]
 
+    #: Whether a :class:`~dynamic_forms.models.ChoiceSet` can be used instead
+    #: of the ``choices`` option.
+    supports_choice_set = True
+
+    _compiled_choices = None
+
+    def __init__(self, name, label, widget_attrs={}, choice_set=None,
+                 **kwargs):
+        #: The :class:`CompiledChoices` of a shared choice set or ``None``.
+        self.choice_set = choice_set
+        super(ChoiceField, self).__init__(name, label, widget_attrs, **kwargs)
+
+    def set_options(self, **kwargs):
+        self._compiled_choices = None
+        super(ChoiceField, self).set_options(**kwargs)
+
+    def get_compiled_choices(self):
+        """
+        Returns the :class:`CompiledChoices` of the choice set or, if none is
+        given, for the ``choices`` option. The latter are parsed once per
+        instance, i.e. once per form schema version.
+        """
+        if self.choice_set is not None:
+            return self.choice_set
+        if self._compiled_choices is None:
+            self._compiled_choices = CompiledChoices.from_text(
+                self.get_option('choices'))
+        return self._compiled_choices
+
     def construct(self, **kwargs):
-        value = self.options.get('choices')[1]
-        choices = [('', '---'),]
-        choices += [(row, row) for row in value.splitlines() if row]
-        return super(ChoiceField, self).construct(choices=choices)
+        kwargs.setdefault('choices', self.get_compiled_choices())
+        return super(ChoiceField, self).construct(**kwargs)
 
     def options_valid(self):
-        if not self.options['choices'] or not self.options['choices'][1]:
+        if self.choice_set is None and not self.get_option('choices'):
             raise ValueError('choices must not be defined for %r' % self)
         return True
 
 
+@dynamic_form_field
+class AutocompleteChoiceField(ChoiceField):
+    """
+    A choice field for very large choice lists. It is rendered as a text
+    input whose options are looked up from the
+    :func:`~dynamic_forms.views.choice_lookup` view.
+    """
+
+    cls = 'dynamic_forms.fields.AutocompleteChoiceField'
+    display_label = _('Choices (autocomplete)')
+
+    def contribute_to_form(self, form):
+        super(AutocompleteChoiceField, self).contribute_to_form(form)
+        schema = getattr(form, 'schema', None)
+        if schema is None or schema.form_id is None:
+            return
+        try:
+            url = reverse('dynamic_forms:choice-lookup', kwargs={
+                'form_id': schema.form_id,
+                'field_name': self.name,
+            })
+        except NoReverseMatch:
+            return
+        form.fields[self.name].widget.attrs['data-autocomplete-url'] = url
+
+
 @dynamic_form_field
 class DateField(BaseDynamicFormField):
 
     cls = 'django.forms.DateField'
     display_label = _('Date')
+    validation_format = 'date'
 
     class Meta:
         localize = [bool, True, forms.NullBooleanField]
@@ -232,6 +439,7 @@ class DateTimeField(BaseDynamicFormField):
 
     cls = 'django.forms.DateTimeField'
     display_label = _('Date and Time')
+    validation_format = 'datetime'
 
     class Meta:
         localize = [bool, True, forms.NullBooleanField]
@@ -242,6 +450,7 @@ class EmailField(BaseDynamicFormField):
 
     cls = 'django.forms.EmailField'
     display_label = _('Email')
+    validation_format = 'email'
 
 
 @dynamic_form_field
@@ -249,12 +458,17 @@ class IntegerField(BaseDynamicFormField):
 
     cls = 'django.forms.IntegerField'
     display_label = _('Integer')
+    validation_format = 'integer'
 
     class Meta:
         localize = [bool, True, forms.NullBooleanField]
         max_value = [int, None, forms.IntegerField]
         min_value = [int, None, forms.IntegerField]
 
+    def get_validation_rules(self):
+        rules = super(IntegerField, self).get_validation_rules()
+        return self._add_option_rules(rules, 'min_value', 'max_value')
+
 
 @dynamic_form_field
 class MultiLineTextField(BaseDynamicFormField):
@@ -274,12 +488,17 @@ class SingleLineTextField(BaseDynamicFormField):
         max_length = [int, None, forms.IntegerField]
         min_length = [int, None, forms.IntegerField]
 
+    def get_validation_rules(self):
+        rules = super(SingleLineTextField, self).get_validation_rules()
+        return self._add_option_rules(rules, 'max_length', 'min_length')
+
 
 @dynamic_form_field
 class TimeField(BaseDynamicFormField):
 
     cls = 'django.forms.TimeField'
     display_label = _('Time')
+    validation_format = 'time'
 
     class Meta:
         localize = [bool, True, forms.NullBooleanField]
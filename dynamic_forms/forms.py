@@ -1,18 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+import re
 from collections import OrderedDict
 
 import six
 from django import forms
 
-from dynamic_forms.formfields import formfield_registry
+from dynamic_forms.schema import get_form_schema
 from django.forms.fields import BooleanField
-import dynamic_forms
 from django.utils.html import conditional_escape, format_html
 from django.utils.encoding import (
     force_text, python_2_unicode_compatible, smart_text,
 )
 from django.utils.safestring import mark_safe
+from django.utils.translation import get_language, ugettext as _
 
 class MultiSelectFormField(forms.MultipleChoiceField):
     # http://djangosnippets.org/snippets/2753/
@@ -35,104 +36,205 @@ class MultiSelectFormField(forms.MultipleChoiceField):
         return value.split(self.separate_values_by)
 
 
-class FormModelForm(forms.Form):
+class _FieldCollector(object):
+    """
+    Collects the fields dynamic form fields contribute to a form.
+    """
 
-    def __init__(self, model, *args, **kwargs):
-        self.model = model
-        super(FormModelForm, self).__init__(*args, **kwargs)
-        self.model_fields = OrderedDict()
-        for field in self.model.fields.all():
-            self.model_fields[field.name] = field
-            field.generate_form_field(self)
-        for field_name, field in self.fields.items():
-            if not type(field) is BooleanField:
-                field.widget.attrs['class'] = 'form-control'
-            if field.required:
-                field.widget.attrs['required'] = 'true'
+    def __init__(self, schema):
+        self.schema = schema
+        self.fields = OrderedDict()
 
-    def get_mapped_data(self, exclude_missing=False):
-        """
-        Returns an dictionary sorted by the position of the respective field
-        in its form.
 
-        :param boolean exclude_missing: If ``True``, non-filled fields (those
-            whose value evaluates to ``False`` are not present in the returned
-            dictionary. Default: ``False``
-        """
-        data = self.cleaned_data
-        mapped_data = OrderedDict()
-        for key, field in six.iteritems(self.model_fields):
-            df = formfield_registry.get(field.field_type)
-            if df and df.do_display_data():
-                name = field.label
-                value = data.get(key, None)
-                if exclude_missing and not bool(value):
-                    continue
-                mapped_data[name] = value
-        return mapped_data
+_RENDER_MARKER = '\x00%s\x00'
+_RENDER_MARKER_RE = re.compile('\x00(errors|field)\x00')
 
-    def _html_output(self, normal_row, error_row, row_ender, help_text_html, errors_on_separate_row):
-        "Helper function for outputting HTML. Used by as_table(), as_ul(), as_p()."
-        top_errors = self.non_field_errors()  # Errors that should be displayed above all fields.
-        output, hidden_fields = [], []
 
-        for name, field in self.fields.items():
-            if type(field) is dynamic_forms.fields.StartGroupField:
-                output.append('<div class="form-group"><h3>%s</h3>' % field.label)
-                if field.help_text:
-                    output.append("<p>%s</p>" % force_text(field.help_text))
-                continue
-            if type(field) is dynamic_forms.fields.EndGroupField:
-                output.append('</div>')
-                continue
-            html_class_attr = ''
-            bf = self[name]
-            # Escape and cache in local variable.
-            bf_errors = self.error_class([conditional_escape(error) for error in bf.errors])
+class RenderPlan(object):
+    """
+    The static HTML of a form's rows and group markers, compiled once per
+    form schema and output format.
+
+    Group headers, escaped labels, help texts, CSS classes and the row markup
+    are joined into fragments when the plan is built. Rendering only fills in
+    the errors and widgets of the bound fields.
+    """
+
+    def __init__(self, form, normal_row, error_row, row_ender, help_text_html,
+                 errors_on_separate_row):
+        self.error_row = error_row
+        self.row_ender = row_ender
+        self.errors_on_separate_row = errors_on_separate_row
+        #: A list of steps, each either a string of static HTML or a 5-tuple
+        #: ``(name, is_hidden, row, error_row, empty_widget)`` where the rows
+        #: are lists of static fragments with the dynamic part names at odd
+        #: indices and ``empty_widget`` is the widget's HTML without a value.
+        self.steps = []
+        # The rows used if hidden fields need a row of their own. Like
+        # Django, they take the CSS classes of the last visible field.
+        self.empty_rows = [self._empty_row(normal_row, '')] * 2
+        markers, trailing_markers = self._get_group_markers(form)
+        for name, field in form.fields.items():
+            self.steps.extend(markers.get(name, ()))
+            bf = form[name]
             if bf.is_hidden:
-                if bf_errors:
-                    top_errors.extend(
-                        [_('(Hidden field %(name)s) %(error)s') % {'name': name, 'error': force_text(e)}
-                         for e in bf_errors])
-                hidden_fields.append(six.text_type(bf))
+                self.steps.append((name, True, None, None, None))
+                self.empty_rows = [self._empty_row(normal_row, '')] * 2
+                continue
+            if bf.label:
+                label = conditional_escape(force_text(bf.label))
+                label = bf.label_tag(label) or ''
+            else:
+                label = ''
+            if field.help_text:
+                help_text = help_text_html % force_text(field.help_text)
             else:
-                # Create a 'class="..."' attribute if the row should have any
-                # CSS classes applied.
-                css_classes = bf.css_classes()
+                help_text = ''
+            rows = []
+            self.empty_rows = []
+            for has_errors in (False, True):
+                css_classes = self._css_classes(form, field, has_errors)
+                html_class_attr = ''
                 if css_classes:
                     html_class_attr = ' class="%s"' % css_classes
-
-                if errors_on_separate_row and bf_errors:
-                    output.append(error_row % force_text(bf_errors))
-
-                if bf.label:
-                    label = conditional_escape(force_text(bf.label))
-                    label = bf.label_tag(label) or ''
-                else:
-                    label = ''
-
-                if field.help_text:
-                    help_text = help_text_html % force_text(field.help_text)
-                else:
-                    help_text = ''
-
-                output.append(normal_row % {
-                    'errors': force_text(bf_errors),
+                rows.append(self._compile_row(normal_row, {
                     'label': force_text(label),
-                    'field': six.text_type(bf),
                     'help_text': help_text,
                     'html_class_attr': html_class_attr,
                     'css_classes': css_classes,
                     'field_name': bf.html_name,
-                })
+                }))
+                self.empty_rows.append(
+                    self._empty_row(normal_row, html_class_attr))
+            self.steps.append((name, False, rows[0], rows[1],
+                self._render_empty_widget(bf, field)))
+        self.steps.extend(trailing_markers)
+
+    @staticmethod
+    def _get_group_markers(form):
+        """
+        Returns a dictionary mapping field names to the HTML of the group
+        markers preceding the field in the form's schema, and a list of those
+        following the last field.
+        """
+        markers, pending = {}, []
+        for field in form.schema.fields:
+            if field.is_group_start:
+                html = '<div class="form-group"><h3>%s</h3>' % field.label
+                if field.help_text:
+                    html += '\n<p>%s</p>' % force_text(field.help_text)
+                pending.append(html)
+            elif field.is_group_end:
+                pending.append('</div>')
+            elif field.name in form.fields:
+                markers[field.name] = pending
+                pending = []
+        return markers, pending
+
+    @staticmethod
+    def _render_empty_widget(bf, field):
+        # Mirrors BoundField.as_widget() for an unbound field without initial
+        # value. Multi widgets, e.g. CAPTCHAs, may render differently each
+        # time.
+        if field.localize or isinstance(field.widget, forms.MultiWidget):
+            return None
+        attrs = {}
+        if bf.auto_id and 'id' not in field.widget.attrs:
+            attrs['id'] = bf.auto_id
+        return force_text(field.widget.render(bf.html_name,
+            field.prepare_value(None), attrs=attrs))
+
+    @staticmethod
+    def _empty_row(normal_row, html_class_attr):
+        return normal_row % {
+            'errors': '',
+            'label': '',
+            'field': '',
+            'help_text': '',
+            'html_class_attr': html_class_attr,
+            'css_classes': '',
+            'field_name': '',
+        }
+
+    @staticmethod
+    def _css_classes(form, field, has_errors):
+        # Mirrors BoundField.css_classes()
+        extra_classes = set()
+        if has_errors and hasattr(form, 'error_css_class'):
+            extra_classes.add(form.error_css_class)
+        if field.required and hasattr(form, 'required_css_class'):
+            extra_classes.add(form.required_css_class)
+        return ' '.join(extra_classes)
+
+    @staticmethod
+    def _compile_row(normal_row, context):
+        context = dict(context, errors=_RENDER_MARKER % 'errors',
+            field=_RENDER_MARKER % 'field')
+        return _RENDER_MARKER_RE.split(normal_row % context)
 
+    def render(self, form):
+        return mark_safe(''.join(self.iter_render(form)))
+
+    def iter_render(self, form):
+        """
+        Yields the HTML of ``form`` in chunks of one row each. Apart from the
+        hidden fields, at most one row is held in memory at a time.
+        """
+        top_errors = form.non_field_errors()  # Errors that should be displayed above all fields.
+        hidden_fields = []
+        # Hidden fields are rendered into the last row and their errors into
+        # the first one, so they are processed first.
+        for step in self.steps:
+            if not isinstance(step, tuple) or not step[1]:
+                continue
+            name = step[0]
+            bf = form[name]
+            bf_errors = form.error_class([conditional_escape(error) for error in bf.errors])
+            if bf_errors:
+                top_errors.extend(
+                    [_('(Hidden field %(name)s) %(error)s') % {'name': name, 'error': force_text(e)}
+                     for e in bf_errors])
+            hidden_fields.append(six.text_type(bf))
+
+        last_row = None
         if top_errors:
-            output.insert(0, error_row % force_text(top_errors))
+            last_row = self.error_row % force_text(top_errors)
+        last_has_errors = False
+        for step in self.steps:
+            if not isinstance(step, tuple):
+                row = step
+            else:
+                name, is_hidden, row, error_row, empty_widget = step
+                if is_hidden:
+                    continue
+                bf = form[name]
+                # Escape and cache in local variable.
+                bf_errors = form.error_class([conditional_escape(error) for error in bf.errors])
+                last_has_errors = bool(bf_errors)
+                if bf_errors:
+                    row = error_row
+                    if self.errors_on_separate_row:
+                        if last_row is not None:
+                            yield last_row + '\n'
+                        last_row = self.error_row % force_text(bf_errors)
+                if (empty_widget is not None and not form.is_bound
+                        and form.fields[name].initial is None
+                        and name not in form.initial):
+                    widget = empty_widget
+                else:
+                    widget = six.text_type(bf)
+                values = {'errors': force_text(bf_errors), 'field': widget}
+                row = list(row)
+                row[1::2] = [values[part] for part in row[1::2]]
+                row = ''.join(row)
+            if last_row is not None:
+                yield last_row + '\n'
+            last_row = row
 
         if hidden_fields:  # Insert any hidden fields in the last row.
             str_hidden = ''.join(hidden_fields)
-            if output:
-                last_row = output[-1]
+            row_ender = self.row_ender
+            if last_row is not None:
                 # Chop off the trailing row_ender (e.g. '</td></tr>') and
                 # insert the hidden fields.
                 if not last_row.endswith(row_ender):
@@ -140,22 +242,194 @@ class FormModelForm(forms.Form):
                     # that users write): if there are only top errors, we may
                     # not be able to conscript the last row for our purposes,
                     # so insert a new, empty row.
-                    last_row = (normal_row % {
-                        'errors': '',
-                        'label': '',
-                        'field': '',
-                        'help_text': '',
-                        'html_class_attr': html_class_attr,
-                        'css_classes': '',
-                        'field_name': '',
-                    })
-                    output.append(last_row)
-                output[-1] = last_row[:-len(row_ender)] + str_hidden + row_ender
+                    yield last_row + '\n'
+                    last_row = self.empty_rows[last_has_errors]
+                last_row = last_row[:-len(row_ender)] + str_hidden + row_ender
             else:
                 # If there aren't any rows in the output, just append the
                 # hidden fields.
-                output.append(str_hidden)
-        return mark_safe('\n'.join(output))
+                last_row = str_hidden
+        if last_row is not None:
+            yield last_row
+
+
+class FormModelForm(forms.Form):
+
+    #: The :class:`~dynamic_forms.schema.FormSchema` a form class generated by
+    #: :func:`formmodelform_factory` has been built from.
+    _schema = None
+
+    #: Whether the :class:`RenderPlan` used by :meth:`as_table`, :meth:`as_ul`
+    #: and :meth:`as_p` is cached per schema. Set to ``False`` if instances
+    #: change the labels or help texts of their fields.
+    use_render_plan = True
+
+    _iter_html_output = False
+
+    def __init__(self, model, *args, **kwargs):
+        self.model = model
+        self.schema = get_form_schema(model)
+        if self._schema is not self.schema:
+            # Instantiated directly instead of through the generated class.
+            # Use the pre-built fields of the latter.
+            schema_fields = self.schema.get_form_class().base_fields
+            if self._schema is None and self.base_fields:
+                self.base_fields = OrderedDict(self.base_fields)
+                self.base_fields.update(schema_fields)
+            else:
+                self.base_fields = schema_fields
+        super(FormModelForm, self).__init__(*args, **kwargs)
+        self.model_fields = self.schema.fields_by_name
+
+    def get_mapped_data(self, exclude_missing=False):
+        """
+        Returns an dictionary sorted by the position of the respective field
+        in its form.
+
+        :param boolean exclude_missing: If ``True``, non-filled fields (those
+            whose value evaluates to ``False`` are not present in the returned
+            dictionary. Default: ``False``
+        """
+        data = self.cleaned_data
+        mapped_data = OrderedDict()
+        for field in self.schema.data_fields:
+            value = data.get(field.name, None)
+            if exclude_missing and not bool(value):
+                continue
+            mapped_data[field.label] = value
+        return mapped_data
+
+    def _get_render_plan(self, normal_row, error_row, row_ender,
+                         help_text_html, errors_on_separate_row):
+        key = (type(self), normal_row, error_row, row_ender, help_text_html,
+            errors_on_separate_row, self.auto_id, self.prefix,
+            self.label_suffix, get_language(), tuple(self.fields))
+        plan = self.schema._render_plans.get(key)
+        if plan is None:
+            plan = RenderPlan(self, normal_row, error_row, row_ender,
+                help_text_html, errors_on_separate_row)
+            if self.use_render_plan:
+                self.schema._render_plans[key] = plan
+        return plan
+
+    def _html_output(self, normal_row, error_row, row_ender, help_text_html, errors_on_separate_row):
+        "Helper function for outputting HTML. Used by as_table(), as_ul(), as_p()."
+        plan = self._get_render_plan(normal_row, error_row, row_ender,
+            help_text_html, errors_on_separate_row)
+        if self._iter_html_output:
+            return plan.iter_render(self)
+        return plan.render(self)
+
+    def _iter_html(self, method):
+        # Reuse the row formats Django's as_*() methods pass to _html_output()
+        self._iter_html_output = True
+        try:
+            html = getattr(self, method)()
+        finally:
+            self._iter_html_output = False
+        if isinstance(html, six.string_types):
+            # _html_output() is overridden
+            return iter([html])
+        return html
+
+    def iter_as_table(self):
+        """
+        Like ``as_table()``, but returns an iterator over chunks of HTML.
+        """
+        return self._iter_html('as_table')
+
+    def iter_as_ul(self):
+        """
+        Like ``as_ul()``, but returns an iterator over chunks of HTML.
+        """
+        return self._iter_html('as_ul')
+
+    def iter_as_p(self):
+        """
+        Like ``as_p()``, but returns an iterator over chunks of HTML.
+        """
+        return self._iter_html('as_p')
 
     def get_id(self):
         return self.model.id
+
+
+STREAMING_FORM_MARKER = '<!--dynamic-forms-streaming-form-->'
+
+
+@python_2_unicode_compatible
+class StreamingFormProxy(object):
+    """
+    Stands in for a form in a template context. ``as_table()``, ``as_ul()``,
+    ``as_p()`` and ``str()`` render a marker instead of the form; all other
+    attributes are taken from the form. :meth:`stream` then yields the
+    rendered template with the marker replaced by the form's HTML, chunk by
+    chunk.
+    """
+
+    def __init__(self, form):
+        self.form = form
+        self.methods = []
+
+    def __getattr__(self, name):
+        return getattr(self.form, name)
+
+    def __getitem__(self, name):
+        return self.form[name]
+
+    def __iter__(self):
+        return iter(self.form)
+
+    def __len__(self):
+        return len(self.form)
+
+    def _marker(self, method):
+        self.methods.append(method)
+        return mark_safe(STREAMING_FORM_MARKER)
+
+    def __str__(self):
+        return self._marker('iter_as_table')
+
+    def as_table(self):
+        return self._marker('iter_as_table')
+
+    def as_ul(self):
+        return self._marker('iter_as_ul')
+
+    def as_p(self):
+        return self._marker('iter_as_p')
+
+    def stream(self, html):
+        parts = html.split(STREAMING_FORM_MARKER)
+        yield parts[0]
+        for method, part in zip(self.methods, parts[1:]):
+            for chunk in getattr(self.form, method)():
+                yield chunk
+            yield part
+
+
+def formmodelform_factory(schema, form=FormModelForm):
+    """
+    Returns a subclass of ``form`` with one declared field per field in the
+    given :class:`~dynamic_forms.schema.FormSchema`. Instances of the returned
+    class only need to copy the pre-built ``base_fields``.
+
+    Use :meth:`~dynamic_forms.schema.FormSchema.get_form_class` to get the
+    memoized class for a schema.
+    """
+    collector = _FieldCollector(schema)
+    for field in schema.form_fields:
+        field.contribute_to_form(collector)
+    for field in collector.fields.values():
+        if not type(field) is BooleanField:
+            field.widget.attrs['class'] = 'form-control'
+        if field.required:
+            field.widget.attrs['required'] = 'true'
+
+    name = str('%s_%s_%s' % (form.__name__, schema.form_id, schema.version))
+    form_class = type(form)(name, (form,), {
+        '__module__': form.__module__,
+        '_schema': schema,
+    })
+    form_class.base_fields = collector.fields
+    return form_class
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import copy
+
+from django.middleware.csrf import get_token
+from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from dynamic_forms.cache import get_form_cache_key, single_flight
+from dynamic_forms.conf import settings
+
+#: Rendered into cached fragments instead of the CSRF token and replaced by
+#: the requesting user's token on every request.
+CSRF_TOKEN_PLACEHOLDER = 'dynamic-forms-csrf-token-placeholder'
+
+
+def get_fragment_cache_key(form_model, template_name):
+    return get_form_cache_key('fragment', form_model, template_name,
+        get_language() or '')
+
+
+def render_form_fragment(request, form_model, template_name, get_context):
+    """
+    Renders ``template_name`` with the context returned by ``get_context()``
+    and returns the HTML.
+
+    If :data:`~dynamic_forms.conf.DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT` is
+    set, the HTML is cached per form, schema version, template and language
+    and ``get_context()`` is only called when the fragment is built. The
+    template is then rendered without a request, i.e. without context
+    processors, and must not depend on anything but the given context and
+    ``{% csrf_token %}``; the latter is filled in for every request.
+    """
+    timeout = settings.DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT
+    if not timeout:
+        return render_to_string(template_name, get_context(),
+            context_instance=RequestContext(request))
+
+    def build():
+        context = get_context()
+        context['csrf_token'] = CSRF_TOKEN_PLACEHOLDER
+        return render_to_string(template_name, context)
+
+    html = single_flight(get_fragment_cache_key(form_model, template_name),
+        build, timeout)
+    return mark_safe(html.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request)))
+
+
+def get_unbound_form_view(request, form_model):
+    """
+    Returns a :class:`~dynamic_forms.views.DynamicFormView` that is not
+    dispatched but used to render the unbound ``form_model`` for ``request``.
+    The form is unbound for any request method.
+    """
+    from dynamic_forms.views import DynamicFormView
+    if request.method != 'GET':
+        # The data posted to the page must not end up in the embedded form
+        request = copy.copy(request)
+        request.method = 'GET'
+    view = DynamicFormView(request=request, args=(),
+        kwargs={'form_id': form_model.pk})
+    view.form_model = form_model
+    return view
+
+
+def render_unbound_form(request, form_model):
+    """
+    Returns the HTML of the unbound form as rendered by
+    :class:`~dynamic_forms.views.DynamicFormView` for a ``GET`` request,
+    through :func:`render_form_fragment`.
+    """
+    view = get_unbound_form_view(request, form_model)
+    return render_form_fragment(request, form_model,
+        view.get_template_names(),
+        lambda: view.get_context_data(
+            form=view.get_form(view.get_form_class())))
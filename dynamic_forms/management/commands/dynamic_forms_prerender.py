@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dynamic_forms.conf import settings
+from dynamic_forms.models import FormModel
+from dynamic_forms.prerender import prerender_form, remove_prerendered_form
+
+
+class Command(BaseCommand):
+    help = ('Writes the HTML and the JSON schema of all displayed forms to a '
+            'directory.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output-dir',
+            help='The directory to write to. Defaults to the '
+                 'DYNAMIC_FORMS_PRERENDER_DIR setting.'),
+    )
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or settings.DYNAMIC_FORMS_PRERENDER_DIR
+        if not directory:
+            raise CommandError('Set DYNAMIC_FORMS_PRERENDER_DIR or pass '
+                '--output-dir.')
+        verbosity = int(options['verbosity'])
+
+        count = 0
+        for form_model in FormModel.objects.all():
+            if not form_model.display:
+                remove_prerendered_form(form_model.pk, directory)
+                continue
+            html_path, json_path = prerender_form(form_model, directory)
+            count += 1
+            if verbosity >= 2:
+                self.stdout.write('%s (%d): %s, %s' % (form_model.name,
+                    form_model.pk, os.path.basename(html_path),
+                    os.path.basename(json_path)))
+        if verbosity >= 1:
+            self.stdout.write('Rendered %d forms to %s.' % (count, directory))
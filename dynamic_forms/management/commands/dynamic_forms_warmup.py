@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import multiprocessing
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from dynamic_forms.formfields import formfield_registry
+from dynamic_forms.models import FormModel
+from dynamic_forms.schema import get_form_schema
+
+
+def warmup_form(form_id):
+    """
+    Compiles the schema and form class of a single form and stores the schema
+    in the shared cache. Returns ``(form_id, number_of_fields, seconds,
+    error)``.
+    """
+    start = time.time()
+    try:
+        schema = get_form_schema(FormModel.objects.get(pk=form_id))
+        schema.get_form_class()
+    except Exception as e:
+        return form_id, 0, time.time() - start, '%s: %s' % (
+            e.__class__.__name__, e)
+    return form_id, len(schema), time.time() - start, None
+
+
+class Command(BaseCommand):
+    help = ('Compiles the schemas of all displayed forms and stores them in '
+            'the shared cache.')
+    # Broken field types (dynamic_forms.E001) are reported by handle(), which
+    # still warms up all other forms.
+    requires_system_checks = False
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', default=1,
+            help='Number of processes used to compile the forms.'),
+    )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1.')
+        verbosity = int(options['verbosity'])
+
+        errors = formfield_registry.resolve_all()
+        for key, e in errors:
+            self.stderr.write('Field type %s: %s' % (key, e))
+
+        forms = dict(FormModel.objects.filter(display=True).values_list(
+            'pk', 'name'))
+        start = time.time()
+        failed = 0
+        for form_id, count, seconds, error in self.warmup(sorted(forms),
+                processes):
+            if error is not None:
+                failed += 1
+                self.stderr.write('%s (%d): %s' % (forms[form_id], form_id,
+                    error))
+            elif verbosity >= 1:
+                self.stdout.write('%s (%d): %d fields in %.1f ms' % (
+                    forms[form_id], form_id, count, seconds * 1000))
+        if verbosity >= 1:
+            self.stdout.write('Warmed up %d forms in %.1f s.' % (
+                len(forms) - failed, time.time() - start))
+
+        if errors or failed:
+            raise CommandError('%d field types and %d forms failed.' % (
+                len(errors), failed))
+
+    def warmup(self, form_ids, processes):
+        if processes == 1 or len(form_ids) < 2:
+            return map(warmup_form, form_ids)
+        # Child processes must not share the parent's database connections
+        connections.close_all()
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(warmup_form, form_ids)
+        finally:
+            pool.close()
+            pool.join()
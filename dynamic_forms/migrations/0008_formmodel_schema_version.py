@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamic_forms', '0007_formmodel_display'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formmodel',
+            name='schema_modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Schema modified at', editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='formmodel',
+            name='schema_version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Schema version', editable=False),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamic_forms', '0008_formmodel_schema_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceSet',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(unique=True, max_length=100, verbose_name='Name')),
+                ('choices', models.TextField(help_text='One choice per line. Empty lines are ignored.', verbose_name='Choices')),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='Version', editable=False)),
+            ],
+            options={
+                'ordering': ['name'],
+                'verbose_name': 'Choice set',
+                'verbose_name_plural': 'Choice sets',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='formfieldmodel',
+            name='choice_set',
+            field=models.ForeignKey(related_name='fields', on_delete=django.db.models.deletion.PROTECT, blank=True, to='dynamic_forms.ChoiceSet', help_text='A shared list of choices used instead of the choices given in the options.', null=True, verbose_name='Choice set'),
+            preserve_default=True,
+        ),
+    ]
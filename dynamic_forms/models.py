@@ -2,12 +2,15 @@
 from __future__ import unicode_literals
 
 import json
+import threading
 from collections import OrderedDict
+from contextlib import contextmanager
 
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.db.transaction import atomic
 from django.template.defaultfilters import slugify
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.encoding import force_text, python_2_unicode_compatible
 from django.utils.html import format_html, format_html_join
@@ -17,6 +20,7 @@ from dynamic_forms.actions import action_registry
 from dynamic_forms.conf import settings
 from dynamic_forms.fields import TextMultiSelectField
 from dynamic_forms.formfields import formfield_registry
+from dynamic_forms.signals import schema_changed
 
 
 @python_2_unicode_compatible
@@ -34,6 +38,10 @@ class FormModel(models.Model):
     recipient_email = models.EmailField(_('Recipient email'), blank=True,
         null=True, help_text=_('Email address to send form data.'))
     display = models.BooleanField(default=True, help_text='Allow form to be viewed.')
+    schema_version = models.PositiveIntegerField(_('Schema version'),
+        default=1, editable=False)
+    schema_modified_at = models.DateTimeField(_('Schema modified at'),
+        default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['name']
@@ -43,6 +51,19 @@ class FormModel(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The schema version is only ever changed by bump_schema_version();
+        # writing back a stale in-memory value would reuse old versions.
+        _exclude_from_update(self, kwargs, 'schema_version',
+            'schema_modified_at')
+        super(FormModel, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # The fields are deleted along with the form; that does not need a
+        # new schema version for each of them.
+        with defer_schema_changes():
+            super(FormModel, self).delete(*args, **kwargs)
+
     def get_fields_as_dict(self):
         """
         Returns an ``OrderedDict`` (``SortedDict`` when ``OrderedDict is not
@@ -51,6 +72,115 @@ class FormModel(models.Model):
         """
         return OrderedDict(self.fields.values_list('name', 'label').all())
 
+    def bump_schema_version(self):
+        """
+        Atomically increments :attr:`schema_version` in the database, updates
+        :attr:`schema_modified_at` and sends
+        :data:`~dynamic_forms.signals.schema_changed`.
+        """
+        self.schema_version, self.schema_modified_at = bump_schema_version(
+            self.pk)
+
+
+def _exclude_from_update(instance, kwargs, *excluded):
+    """
+    Makes an update of ``instance`` through ``save(**kwargs)`` write all
+    fields except ``excluded``, unless ``update_fields`` or ``force_insert``
+    are given.
+    """
+    if (instance._state.adding or kwargs.get('force_insert')
+            or kwargs.get('update_fields') is not None):
+        return
+    kwargs['update_fields'] = [f.name for f in instance._meta.concrete_fields
+                               if not f.primary_key and f.name not in excluded]
+
+
+# The ids of the forms changed within defer_schema_changes(), by thread. None
+# outside of it.
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_schema_changes():
+    """
+    Collects the forms whose schema changes within the block and bumps the
+    schema version of each of them once, when the block is left without an
+    exception. Nested blocks are part of the outermost one.
+    """
+    if getattr(_deferred, 'form_ids', None) is not None:
+        yield
+        return
+    _deferred.form_ids = form_ids = set()
+    try:
+        yield
+    finally:
+        _deferred.form_ids = None
+    for form_id in sorted(form_ids):
+        bump_schema_version(form_id)
+
+
+def _defer_schema_change(form_id):
+    """
+    Returns ``True`` if the schema version of the form is bumped later by
+    :func:`defer_schema_changes`.
+    """
+    form_ids = getattr(_deferred, 'form_ids', None)
+    if form_ids is None:
+        return False
+    form_ids.add(form_id)
+    return True
+
+
+def bump_schema_version(form_id):
+    """
+    Increments the ``schema_version`` of the form with the primary key
+    ``form_id`` and returns the new ``(schema_version, schema_modified_at)``.
+    """
+    now = timezone.now()
+    with atomic():
+        FormModel.objects.filter(pk=form_id).update(
+            schema_version=models.F('schema_version') + 1,
+            schema_modified_at=now)
+        version = FormModel.objects.filter(pk=form_id).values_list(
+            'schema_version', flat=True).first()
+    if version is not None:
+        schema_changed.send(sender=FormModel, form_id=form_id,
+            version=version, modified_at=now)
+    return version, now
+
+
+@python_2_unicode_compatible
+class ChoiceSet(models.Model):
+    name = models.CharField(_('Name'), max_length=100, unique=True)
+    choices = models.TextField(_('Choices'),
+        help_text=_('One choice per line. Empty lines are ignored.'))
+    version = models.PositiveIntegerField(_('Version'), default=1,
+        editable=False)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = _('Choice set')
+        verbose_name_plural = _('Choice sets')
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        _exclude_from_update(self, kwargs, 'version')
+        with atomic():
+            super(ChoiceSet, self).save(*args, **kwargs)
+            if adding:
+                return
+            ChoiceSet.objects.filter(pk=self.pk).update(
+                version=models.F('version') + 1)
+            self.version = ChoiceSet.objects.filter(pk=self.pk).values_list(
+                'version', flat=True).get()
+            form_ids = FormModel.objects.filter(
+                fields__choice_set=self).values_list('pk', flat=True)
+            for form_id in set(form_ids):
+                bump_schema_version(form_id)
+
 
 @python_2_unicode_compatible
 class FormFieldModel(models.Model):
@@ -62,6 +192,11 @@ class FormFieldModel(models.Model):
     label = models.CharField(_('Label'), max_length=255)
     name = models.SlugField(_('Name'), max_length=50, blank=True)
     _options = models.TextField(_('Options'), blank=True, null=True)
+    choice_set = models.ForeignKey(ChoiceSet, on_delete=models.PROTECT,
+        related_name='fields', blank=True, null=True,
+        verbose_name=_('Choice set'),
+        help_text=_('A shared list of choices used instead of the choices '
+                    'given in the options.'))
     position = models.SmallIntegerField(_('Position'), blank=True, default=0)
 
     class Meta:
@@ -122,6 +257,37 @@ class FormFieldModel(models.Model):
 
         super(FormFieldModel, self).save(*args, **kwargs)
 
+    def update_parent_schema_version(self):
+        version, modified_at = bump_schema_version(self.parent_form_id)
+        # Keep an already loaded parent form in sync with the database
+        cache_name = self._meta.get_field('parent_form').get_cache_name()
+        parent = getattr(self, cache_name, None)
+        if parent is not None and version is not None:
+            parent.schema_version = version
+            parent.schema_modified_at = modified_at
+
+
+def form_model_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        schema_changed.send(sender=FormModel, form_id=instance.pk,
+            version=instance.schema_version,
+            modified_at=instance.schema_modified_at)
+    elif not _defer_schema_change(instance.pk):
+        instance.bump_schema_version()
+
+
+def form_model_deleted(sender, instance, **kwargs):
+    schema_changed.send(sender=FormModel, form_id=instance.pk, version=None,
+        modified_at=timezone.now())
+
+
+def form_field_model_changed(sender, instance, raw=False, **kwargs):
+    if raw or _defer_schema_change(instance.parent_form_id):
+        return
+    instance.update_parent_schema_version()
+
 
 @python_2_unicode_compatible
 class FormModelData(models.Model):
@@ -144,6 +310,24 @@ class FormModelData(models.Model):
             'date': self.submitted,
         }
 
+    @classmethod
+    def generate_display_keys(cls, count):
+        """
+        Returns a list of ``count`` new, unique display keys. Candidates are
+        checked against the stored data sets in bulk instead of one query per
+        key.
+        """
+        keys = set()
+        while len(keys) < count:
+            candidates = list(set(get_random_string(24)
+                for i in range(count - len(keys))) - keys)
+            for i in range(0, len(candidates), 500):
+                chunk = candidates[i:i + 500]
+                taken = cls.objects.filter(display_key__in=chunk).values_list(
+                    'display_key', flat=True)
+                keys.update(set(chunk) - set(taken))
+        return list(keys)
+
     def save(self, *args, **kwargs):
         with atomic():
             if self.form.allow_display and not self.display_key:
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import logging
+import os
+import tempfile
+import threading
+
+from django.core.urlresolvers import reverse
+from django.http import HttpRequest
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from dynamic_forms.cache import get_form_model
+from dynamic_forms.conf import settings
+from dynamic_forms.fragments import get_unbound_form_view
+from dynamic_forms.models import FormModel
+from dynamic_forms.schema import get_form_schema
+
+logger = logging.getLogger(__name__)
+
+
+#: Appended to pre-rendered forms. When a ``POST`` form on the page without a
+#: CSRF token is submitted, adds the token from the CSRF cookie. Without the
+#: cookie, the token is first fetched from
+#: :func:`~dynamic_forms.views.csrf_token`, which also sets the cookie. Page
+#: views do not request anything.
+CSRF_TOKEN_SCRIPT = '''
+<script>
+(function () {
+  function getCookie(name) {
+    var cookies = document.cookie ? document.cookie.split(';') : [];
+    for (var i = 0; i < cookies.length; i++) {
+      var cookie = cookies[i].replace(/^ +/, '');
+      if (cookie.indexOf(name + '=') === 0) {
+        return decodeURIComponent(cookie.substring(name.length + 1));
+      }
+    }
+    return null;
+  }
+  function addToken(form, token) {
+    var input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = 'csrfmiddlewaretoken';
+    input.value = token;
+    form.appendChild(input);
+  }
+  document.addEventListener('submit', function (event) {
+    var form = event.target;
+    if ((form.getAttribute('method') || '').toLowerCase() !== 'post' ||
+        form.elements.csrfmiddlewaretoken) {
+      return;
+    }
+    var token = getCookie('%(cookie)s');
+    if (token) {
+      addToken(form, token);
+      return;
+    }
+    event.preventDefault();
+    var xhr = new XMLHttpRequest();
+    xhr.onreadystatechange = function () {
+      if (xhr.readyState !== 4) {
+        return;
+      }
+      if (xhr.status === 200) {
+        addToken(form, JSON.parse(xhr.responseText).csrf_token);
+      }
+      // Does not fire the submit event again
+      form.submit();
+    };
+    xhr.open('GET', '%(url)s');
+    xhr.send();
+  }, false);
+})();
+</script>
+'''
+
+
+def render_form_html(form_model):
+    """
+    Returns the HTML of the unbound form as rendered by
+    :class:`~dynamic_forms.views.DynamicFormView`, but with
+    :data:`CSRF_TOKEN_SCRIPT` in place of a CSRF token.
+    """
+    request = HttpRequest()
+    request.method = 'GET'
+    view = get_unbound_form_view(request, form_model)
+    context = view.get_context_data(
+        form=view.get_form(view.get_form_class()))
+    # Makes {% csrf_token %} render nothing
+    context['csrf_token'] = 'NOTPROVIDED'
+    html = render_to_string(view.get_template_names(), context)
+    return html + CSRF_TOKEN_SCRIPT % {
+        'url': reverse('dynamic_forms:csrf-token'),
+        'cookie': settings.CSRF_COOKIE_NAME}
+
+
+def _write_file(path, content):
+    # Write to a temporary file first, so a web server never sees a partially
+    # written file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+        prefix='.tmp-')
+    try:
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def get_prerender_paths(form_id, directory):
+    return (os.path.join(directory, '%d.html' % form_id),
+            os.path.join(directory, '%d.json' % form_id))
+
+
+def prerender_form(form_model, directory):
+    """
+    Writes the form's unbound HTML to ``<directory>/<id>.html`` and its
+    schema to ``<directory>/<id>.json`` and returns both paths. The HTML is
+    rendered in the default language.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    html_path, json_path = get_prerender_paths(form_model.pk, directory)
+    with translation.override(settings.LANGUAGE_CODE):
+        html = render_form_html(form_model)
+    _write_file(html_path, html)
+    _write_file(json_path, get_form_schema(form_model).to_json())
+    return html_path, json_path
+
+
+def remove_prerendered_form(form_id, directory):
+    for path in get_prerender_paths(form_id, directory):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def update_prerendered_form(form_id, directory):
+    """
+    Renders the form with the primary key ``form_id`` to ``directory`` again,
+    or removes its files if it has been deleted or is no longer displayed.
+    Errors are logged, not raised.
+    """
+    try:
+        try:
+            form_model = get_form_model(form_id)
+        except FormModel.DoesNotExist:
+            form_model = None
+        if form_model is None or not form_model.display:
+            remove_prerendered_form(form_id, directory)
+        else:
+            prerender_form(form_model, directory)
+    except Exception:
+        logger.exception('Cannot prerender form %s', form_id)
+
+
+# The ids of the forms changed during the current request, by thread. None
+# outside of requests.
+_pending = threading.local()
+
+
+def schema_changed_receiver(sender, form_id, version, **kwargs):
+    """
+    Updates the files of a form whenever its schema changes if
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_PRERENDER_DIR` is set (see
+    :func:`update_prerendered_form`). During a request, every changed form is
+    only updated once, when the request has finished.
+    """
+    directory = settings.DYNAMIC_FORMS_PRERENDER_DIR
+    if not directory:
+        return
+    form_ids = getattr(_pending, 'form_ids', None)
+    if form_ids is None:
+        update_prerendered_form(form_id, directory)
+    else:
+        form_ids.add(form_id)
+
+
+def request_started_receiver(sender, **kwargs):
+    _pending.form_ids = set()
+
+
+def request_finished_receiver(sender, **kwargs):
+    form_ids = getattr(_pending, 'form_ids', None)
+    _pending.form_ids = None
+    directory = settings.DYNAMIC_FORMS_PRERENDER_DIR
+    if form_ids and directory:
+        for form_id in sorted(form_ids):
+            update_prerendered_form(form_id, directory)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import threading
+from collections import OrderedDict
+
+from dynamic_forms.cache import get_form_cache_key, single_flight
+from dynamic_forms.conf import settings
+from dynamic_forms.formfields import (
+    AutocompleteChoiceField, ChoiceField, CompiledChoices, formfield_registry,
+)
+
+
+class SchemaField(object):
+    """
+    The compiled definition of a single :class:`~dynamic_forms.models.FormFieldModel`.
+
+    Holds everything needed to construct the respective
+    :class:`django.forms.Field` without touching the database or parsing the
+    field's JSON options again.
+    """
+
+    def __init__(self, name, label, field_type, options=None, position=0,
+                 group=None, choice_set=None, choice_set_ref=None):
+        self.name = name
+        self.label = label
+        self.field_type = field_type
+        self.options = options or {}
+        self.position = position
+        self.group = group
+        self.choice_set = choice_set
+        self.choice_set_ref = choice_set_ref
+        self.type_cls = formfield_registry.get(field_type)
+        kwargs = dict(self.options)
+        if choice_set is not None and getattr(self.type_cls,
+                'supports_choice_set', False):
+            kwargs['choice_set'] = choice_set
+        self.dynamic_field = self.type_cls(name=name, label=label, **kwargs)
+
+    def __repr__(self):
+        return '<SchemaField %s (%s)>' % (self.name, self.field_type)
+
+    def __getstate__(self):
+        # Only plain data; the field type and the shared compiled choices are
+        # looked up again when the field is loaded.
+        return {
+            'name': self.name,
+            'label': self.label,
+            'field_type': self.field_type,
+            'options': self.options,
+            'position': self.position,
+            'group': self.group,
+            'choice_set_ref': self.choice_set_ref,
+        }
+
+    def __setstate__(self, state):
+        state = dict(state)
+        choice_set_ref = state.pop('choice_set_ref', None)
+        choice_set = None
+        if choice_set_ref is not None:
+            choice_set_ref = tuple(choice_set_ref)
+            choice_set = get_compiled_choice_set_by_ref(*choice_set_ref)
+        self.__init__(choice_set=choice_set, choice_set_ref=choice_set_ref,
+            **state)
+
+    @property
+    def is_group_start(self):
+        return self.field_type == 'dynamic_forms.formfields.StartGroupField'
+
+    @property
+    def is_group_end(self):
+        return self.field_type == 'dynamic_forms.formfields.EndGroupField'
+
+    @property
+    def is_group_marker(self):
+        return self.is_group_start or self.is_group_end
+
+    @property
+    def help_text(self):
+        return self.options.get('help_text', '')
+
+    def construct(self):
+        return self.dynamic_field.construct()
+
+    def to_dict(self):
+        # The choices are only sent as the list below, if at all
+        options = dict((key, value) for key, value in self.options.items()
+                       if key not in ('choices', 'choice_set'))
+        data = {
+            'name': self.name,
+            'label': self.label,
+            'type': self.field_type,
+            'position': self.position,
+            'group': self.group,
+            'options': options,
+            'display_data': self.type_cls.do_display_data(),
+            'rules': self.dynamic_field.get_validation_rules(),
+        }
+        field = self.dynamic_field
+        # Autocomplete choices are looked up page by page instead
+        if (isinstance(field, ChoiceField)
+                and not isinstance(field, AutocompleteChoiceField)):
+            data['choices'] = [value for value, label
+                in field.get_compiled_choices().choices if value != '']
+        return data
+
+    def contribute_to_form(self, form):
+        self.dynamic_field.contribute_to_form(form)
+
+
+class SchemaGroup(object):
+    """
+    A group of fields, started by a
+    :class:`~dynamic_forms.formfields.StartGroupField` and ended by an
+    :class:`~dynamic_forms.formfields.EndGroupField`. ``children`` holds the
+    group's fields and nested groups in order.
+    """
+
+    def __init__(self, field, parent=None):
+        self.field = field
+        self.parent = parent
+        self.children = []
+
+    def __repr__(self):
+        return '<SchemaGroup %s children=%d>' % (self.name, len(self.children))
+
+    @property
+    def name(self):
+        return self.field.name
+
+    @property
+    def label(self):
+        return self.field.label
+
+    @property
+    def help_text(self):
+        return self.field.help_text
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'label': self.label,
+            'help_text': self.help_text,
+            'children': [child.to_dict() if isinstance(child, SchemaGroup)
+                         else child.name for child in self.children],
+        }
+
+    def iter_fields(self):
+        """
+        Yields the fields of this group and all nested groups.
+        """
+        for child in self.children:
+            if isinstance(child, SchemaGroup):
+                for field in child.iter_fields():
+                    yield field
+            else:
+                yield child
+
+
+class FormSchema(object):
+    """
+    The compiled, ordered list of fields of a
+    :class:`~dynamic_forms.models.FormModel`.
+
+    Use :func:`get_form_schema` to get the cached schema for a form model
+    instead of creating instances directly.
+    """
+
+    def __init__(self, form_id, fields, version=None, modified_at=None):
+        self.form_id = form_id
+        self.version = version
+        self.modified_at = modified_at
+        self.fields = list(fields)
+        self.fields_by_name = OrderedDict((f.name, f) for f in self.fields)
+        #: The fields that contribute a field to the form, i.e. all but the
+        #: group markers.
+        self.form_fields = [f for f in self.fields if not f.is_group_marker]
+        #: The form fields whose values are stored, mailed and exported.
+        self.data_fields = [f for f in self.form_fields
+                            if f.type_cls.do_display_data()]
+        self.tree, self.groups = self._build_tree(self.fields)
+        self._form_class = None
+        self._render_plans = {}
+        self._json = None
+
+    @staticmethod
+    def _build_tree(fields):
+        tree, groups = [], []
+        group = None
+        for field in fields:
+            if field.is_group_end:
+                # An unmatched end marker is ignored
+                if group is not None:
+                    group = group.parent
+                continue
+            field.group = group.name if group is not None else None
+            if field.is_group_start:
+                node = SchemaGroup(field, parent=group)
+                groups.append(node)
+            else:
+                node = field
+            (group.children if group is not None else tree).append(node)
+            if field.is_group_start:
+                group = node
+        return tree, groups
+
+    def __repr__(self):
+        return '<FormSchema form=%s version=%s fields=%d>' % (self.form_id,
+            self.version, len(self.fields))
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __getstate__(self):
+        # Only plain data, so the schema can be stored compactly in any cache
+        # backend. The generated form class is rebuilt on demand.
+        return {
+            'form_id': self.form_id,
+            'version': self.version,
+            'modified_at': self.modified_at,
+            'fields': [field.__getstate__() for field in self.fields],
+        }
+
+    def __setstate__(self, state):
+        fields = []
+        for field_state in state['fields']:
+            field = SchemaField.__new__(SchemaField)
+            field.__setstate__(field_state)
+            fields.append(field)
+        self.__init__(state['form_id'], fields, version=state['version'],
+            modified_at=state.get('modified_at'))
+
+    @classmethod
+    def from_form_model(cls, form_model):
+        fields = []
+        for field_model in form_model.fields.select_related('choice_set'):
+            kwargs = dict(field_model.get_form_field_kwargs())
+            name = kwargs.pop('name')
+            label = kwargs.pop('label')
+            choice_set = choice_set_ref = None
+            if field_model.choice_set_id is not None:
+                choice_set = get_compiled_choice_set(field_model.choice_set)
+                choice_set_ref = (field_model.choice_set_id,
+                    field_model.choice_set.version)
+            fields.append(SchemaField(name, label, field_model.field_type,
+                options=kwargs, position=field_model.position,
+                choice_set=choice_set, choice_set_ref=choice_set_ref))
+        return cls(form_model.pk, fields, version=form_model.schema_version,
+            modified_at=form_model.schema_modified_at)
+
+    def to_dict(self):
+        """
+        Returns the schema as a JSON serializable dictionary with the form's
+        id and schema version, a list of its fields and its group tree.
+        """
+        return {
+            'id': self.form_id,
+            'version': self.version,
+            'fields': [field.to_dict() for field in self.fields],
+            'tree': [node.to_dict() if isinstance(node, SchemaGroup)
+                     else node.name for node in self.tree],
+        }
+
+    def to_json(self):
+        """
+        Returns :meth:`to_dict` serialized as JSON. The result is built once
+        per schema.
+        """
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), ensure_ascii=False)
+        return self._json
+
+    def get_form_class(self):
+        """
+        Returns a :class:`~dynamic_forms.forms.FormModelForm` subclass with
+        the fields of this schema as ``base_fields``. The class is built once
+        per schema.
+        """
+        if self._form_class is None:
+            from dynamic_forms.forms import formmodelform_factory
+            self._form_class = formmodelform_factory(self)
+        return self._form_class
+
+    def get_field(self, name):
+        return self.fields_by_name[name]
+
+    def get_group(self, name):
+        for group in self.groups:
+            if group.name == name:
+                return group
+        raise KeyError(name)
+
+
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+_choice_set_cache = {}
+
+
+def get_compiled_choice_set(choice_set):
+    """
+    Returns the :class:`~dynamic_forms.formfields.CompiledChoices` for the
+    given :class:`~dynamic_forms.models.ChoiceSet`. Only one compiled instance
+    per set and version exists per process and is shared by all forms using
+    the set.
+    """
+    cached = _choice_set_cache.get(choice_set.pk)
+    if cached is None or cached[0] != choice_set.version:
+        cached = (choice_set.version,
+            CompiledChoices.from_text(choice_set.choices))
+        with _schema_lock:
+            _choice_set_cache[choice_set.pk] = cached
+    return cached[1]
+
+
+def get_compiled_choice_set_by_ref(choice_set_id, version):
+    """
+    Returns the :class:`~dynamic_forms.formfields.CompiledChoices` of the
+    :class:`~dynamic_forms.models.ChoiceSet` with the given primary key,
+    loading the set from the database unless the given version is already
+    compiled in this process.
+    """
+    cached = _choice_set_cache.get(choice_set_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    from dynamic_forms.models import ChoiceSet
+    return get_compiled_choice_set(ChoiceSet.objects.get(pk=choice_set_id))
+
+
+def get_schema_cache_key(form_model):
+    return get_form_cache_key('schema', form_model)
+
+
+def get_form_schema(form_model):
+    """
+    Returns the :class:`FormSchema` for the given form model. The schema is
+    built on first access and cached per form id and schema version, both in
+    the current process and in the shared Django cache. Only one process at a
+    time builds the schema of a form (see
+    :func:`~dynamic_forms.cache.single_flight`).
+    """
+    if form_model.pk is None:
+        return FormSchema.from_form_model(form_model)
+    schema = _schema_cache.get(form_model.pk)
+    if (schema is None or schema.version != form_model.schema_version
+            or schema.modified_at != form_model.schema_modified_at):
+        schema = single_flight(get_schema_cache_key(form_model),
+            lambda: FormSchema.from_form_model(form_model),
+            settings.DYNAMIC_FORMS_SCHEMA_CACHE_TIMEOUT)
+        with _schema_lock:
+            _schema_cache[form_model.pk] = schema
+    return schema
+
+
+def invalidate_form_schema(form_id):
+    with _schema_lock:
+        _schema_cache.pop(form_id, None)
+
+
+def clear_schema_cache():
+    with _schema_lock:
+        _schema_cache.clear()
+        _choice_set_cache.clear()
+
+
+def schema_changed_receiver(sender, form_id, **kwargs):
+    invalidate_form_schema(form_id)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.dispatch import Signal
+
+#: Sent whenever the definition of a form changes, i.e. the form itself or
+#: one of its fields has been created, changed, reordered or deleted. The
+#: ``version`` is ``None`` if the form has been deleted.
+schema_changed = Signal(providing_args=['form_id', 'version', 'modified_at'])
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import transaction
+
+from dynamic_forms.actions import action_registry
+from dynamic_forms.cache import get_form_model
+from dynamic_forms.schema import get_form_schema
+from dynamic_forms.utils import is_old_style_action
+
+
+class SubmissionContext(object):
+    """
+    Everything needed to process a single submission of a form: the form
+    model, its compiled :class:`~dynamic_forms.schema.FormSchema`, the request
+    and, once validated, the bound form and the results of all actions.
+
+    The form model and its fields are loaded once and shared by the view,
+    the form and all actions. Actions registered with ``takes_context=True``
+    are called with the context as their only argument.
+    """
+
+    def __init__(self, form_model, request=None, schema=None):
+        self.form_model = form_model
+        self.request = request
+        self.schema = schema if schema is not None else get_form_schema(
+            form_model)
+        self.form = None
+        self.action_results = {}
+
+    @classmethod
+    def load(cls, form_id, request=None):
+        """
+        Returns a new context for the form model with the primary key
+        ``form_id``, taken from the per-process form model cache if possible.
+        Raises ``FormModel.DoesNotExist`` if there is no such form.
+        """
+        return cls(get_form_model(form_id), request)
+
+    @property
+    def fields(self):
+        """
+        The :class:`~dynamic_forms.schema.SchemaField` instances of the form
+        in their order.
+        """
+        return self.schema.fields
+
+    def get_form_class(self):
+        return self.schema.get_form_class()
+
+    def get_form(self, data=None, files=None, **kwargs):
+        form_class = self.get_form_class()
+        self.form = form_class(model=self.form_model, data=data, files=files,
+            **kwargs)
+        return self.form
+
+    def run_actions(self, form=None):
+        """
+        Calls all actions configured for the form with the validated ``form``
+        and returns a dictionary mapping the action keys to the actions'
+        return values. ``None`` results are left out.
+        """
+        if form is not None:
+            self.form = form
+        for actionkey, action in self._get_actions():
+            result = self._call_action(action)
+            if result is not None:
+                self.action_results[actionkey] = result
+        return self.action_results
+
+    def _get_actions(self):
+        for actionkey in self.form_model.actions:
+            action = action_registry.get(actionkey)
+            if action is not None:
+                yield actionkey, action
+
+    def _call_action(self, action):
+        if getattr(action, 'takes_context', False):
+            return action(self)
+        elif is_old_style_action(action):
+            return action(self.form_model, self.form)
+        return action(self.form_model, self.form, self.request)
+
+    def run_batch_actions(self, forms):
+        """
+        Calls all actions configured for the form with each of the validated
+        ``forms`` and returns a list with one dictionary of action results
+        per form, like :meth:`run_actions`.
+
+        Actions registered with a ``batch`` function are called once for all
+        forms as ``batch(context, forms)`` and must return a list with one
+        result per form, else a ``ValueError`` is raised. Other actions are
+        called once per form, with :attr:`form` set to the respective form.
+
+        All actions run in one transaction, which is rolled back if any of
+        them fails. Batch functions with a true ``run_last`` attribute, like
+        the one sending the mails, are called after all other actions.
+        """
+        results = [{} for form in forms]
+        actions = sorted(self._get_actions(), key=lambda item: getattr(
+            getattr(item[1], 'batch', None), 'run_last', False))
+        try:
+            with transaction.atomic():
+                for actionkey, action in actions:
+                    values = self._run_batch_action(actionkey, action, forms)
+                    for form_results, value in zip(results, values):
+                        if value is not None:
+                            form_results[actionkey] = value
+        finally:
+            self.form = None
+        return results
+
+    def _run_batch_action(self, actionkey, action, forms):
+        batch = getattr(action, 'batch', None)
+        if batch is None:
+            values = []
+            for form in forms:
+                self.form = form
+                values.append(self._call_action(action))
+            return values
+        values = list(batch(self, forms))
+        if len(values) != len(forms):
+            raise ValueError('%s returned %d results for %d forms' % (
+                actionkey, len(values), len(forms)))
+        return values
+
+    def submit_batch(self, data_list):
+        """
+        Validates every item of ``data_list`` with one bound form per item,
+        all of the same form class, and runs the actions for all valid forms
+        at once (see :meth:`run_batch_actions`).
+
+        Returns a list of 2-tuples ``(form, action_results)`` in the order of
+        ``data_list``. ``action_results`` is ``None`` for invalid forms.
+        """
+        form_class = self.get_form_class()
+        forms = [form_class(model=self.form_model, data=data)
+                 for data in data_list]
+        results = iter(self.run_batch_actions(
+            [form for form in forms if form.is_valid()]))
+        return [(form, next(results) if form.is_valid() else None)
+                for form in forms]
+
+
+def submit_batch(form_model, data_list, request=None):
+    """
+    Submits many data sets for ``form_model`` at once and returns the
+    results of :meth:`SubmissionContext.submit_batch`.
+    """
+    return SubmissionContext(form_model, request).submit_batch(data_list)
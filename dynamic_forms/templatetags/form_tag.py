@@ -1,61 +1,177 @@
+import re
+
 from django import template
 from django.utils.safestring import mark_safe
+
+from dynamic_forms.cache import LRUCache, get_form_model
+from dynamic_forms.conf import settings
+from dynamic_forms.fragments import render_unbound_form
 register = template.Library()
 
+#: Matches a ``[totc-form id=<form id>]`` shortcode.
+SHORTCODE_RE = re.compile(r'\[totc-form id=(\d+)\]')
+
+# Added once per page, before the first embedded form
+FORM_TAG_SCRIPTS = '''
+    <script src="https://static.talesofthecocktail.com/js/vendor/jquery.js"></script>
+    <script src="https://static.talesofthecocktail.com/js/validation/jquery.validate.min.js"></script>
+    <script>
+
+    function getCookie(c_name)
+    {
+        if (document.cookie.length > 0)
+        {
+            c_start = document.cookie.indexOf(c_name + "=");
+            if (c_start != -1)
+            {
+                c_start = c_start + c_name.length + 1;
+                c_end = document.cookie.indexOf(";", c_start);
+                if (c_end == -1) c_end = document.cookie.length;
+                return unescape(document.cookie.substring(c_start,c_end));
+            }
+        }
+        return "";
+     }
+
+    $(window).on('load', function() {
+      $.ajaxSetup({
+        headers: { "X-CSRFToken": getCookie("csrftoken") }
+      });
+    });
+    </script>
+'''
+
+# Added for every shortcode; %(suffix)s numbers all but the first form
+FORM_TAG_EMBED = '''
+    <div id="form-insertion%(suffix)s" class="form-insertion"></div>
+    <div id="form-thanks%(suffix)s" class="form-thanks" style="display: none;">Thanks for your submission!</div>
+    <script>
+    $(window).on('load', function() {
+      var xhr = new XMLHttpRequest();
+      xhr.onreadystatechange = function () {
+          if (xhr.readyState === 4) {
+              var $insertion = $('#form-insertion%(suffix)s');
+              $insertion.html(xhr.responseText);
+              var $form = $insertion.find('form');
+              $form.ajaxForm({url: '/dynamic_forms/forms/%(id)s/', type: 'post', success:    function() {
+                  $insertion.html("");
+                  $('#form-thanks%(suffix)s').css('display', 'block');
+                  $form.validate();
+              }});
+          }
+      };
+      xhr.open('GET', '/dynamic_forms/forms/%(id)s/');
+      xhr.send();
+    });
+    </script>
+'''
 
-@register.assignment_tag
-def form_tag(body):
+# Like FORM_TAG_EMBED, but with the form rendered into the page. Without
+# JavaScript the form is submitted as usual.
+FORM_TAG_INLINE_EMBED = '''
+    <div id="form-insertion%(suffix)s" class="form-insertion">%(form)s</div>
+    <div id="form-thanks%(suffix)s" class="form-thanks" style="display: none;">Thanks for your submission!</div>
+    <script>
+    $(window).on('load', function() {
+      var $insertion = $('#form-insertion%(suffix)s');
+      var $form = $insertion.find('form');
+      if ($.fn.ajaxForm) {
+          $form.ajaxForm({url: '/dynamic_forms/forms/%(id)s/', type: 'post', success:    function() {
+              $insertion.html("");
+              $('#form-thanks%(suffix)s').css('display', 'block');
+              $form.validate();
+          }});
+      }
+    });
+    </script>
+'''
+
+#: Stands in for an inline form in the cached output of :func:`form_tag`.
+INLINE_FORM_PLACEHOLDER = '<!--dynamic-forms-inline-form:%s-->'
+INLINE_FORM_PLACEHOLDER_RE = re.compile(r'<!--dynamic-forms-inline-form:(\d+)-->')
+
+
+#: Caches the expanded bodies per process. The expansion only depends on the
+#: body, so an entry never becomes outdated.
+form_tag_cache = LRUCache(
+    maxsize=settings.DYNAMIC_FORMS_FORM_TAG_CACHE_SIZE,
+    ttl=settings.DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT,
+)
+
+
+def expand_shortcodes(body, inline=False):
     """
-    tag usage {% form_tag id %}
+    Replaces all ``[totc-form id=<form id>]`` shortcodes in ``body`` with the
+    code embedding the respective form. If ``inline`` is ``True``, the code
+    contains an :data:`INLINE_FORM_PLACEHOLDER` for the form's HTML.
     """
-    if '[totc-form' in body:
-        start_index = body.find('totc-form id=')
-        start_id_index = start_index + 13
-        end_index = body.find(']', start_index)
-        form_id = body[start_id_index:end_index]
-        replace_string = '''
-            <div id="form-insertion"></div>
-            <div id="form-thanks" style="display: none;">Thanks for your submission!</div>
-            <script src="https://static.talesofthecocktail.com/js/vendor/jquery.js"></script>
-            <script src="https://static.talesofthecocktail.com/js/validation/jquery.validate.min.js"></script>
-            <script>
-
-            function getCookie(c_name)
-            {
-                if (document.cookie.length > 0)
-                {
-                    c_start = document.cookie.indexOf(c_name + "=");
-                    if (c_start != -1)
-                    {
-                        c_start = c_start + c_name.length + 1;
-                        c_end = document.cookie.indexOf(";", c_start);
-                        if (c_end == -1) c_end = document.cookie.length;
-                        return unescape(document.cookie.substring(c_start,c_end));
-                    }
-                }
-                return "";
-             }
-
-            $(window).on('load', function() {
-              $.ajaxSetup({
-                headers: { "X-CSRFToken": getCookie("csrftoken") }
-              });
-              var xhr = new XMLHttpRequest(); 
-              xhr.onreadystatechange = function () {
-                  if (xhr.readyState === 4) {     
-                      $('#form-insertion').html(xhr.responseText);
-                      $("#dynamic-form").ajaxForm({url: '/dynamic_forms/forms/%s/', type: 'post', success:    function() { 
-                          $('#form-insertion').html("");
-                          $('#form-thanks').css('display', 'block');
-                          $('#dynamic-form').validate();
-                      }});
-                  }   
-              };      
-              xhr.open('GET', '/dynamic_forms/forms/%s/');
-              xhr.send();
-            });
-            </script>
-        ''' % (form_id, form_id)
-        safe = mark_safe(replace_string)
-        body = body.replace(body[start_index-1:end_index+1], safe)
-    return mark_safe(body)
+    counter = [0]
+
+    def replace(match):
+        n = counter[0]
+        counter[0] += 1
+        form_id = match.group(1)
+        # The first form keeps the ids of a page with a single form
+        suffix = '-%d' % n if n else ''
+        if inline:
+            embed = FORM_TAG_INLINE_EMBED % {'suffix': suffix, 'id': form_id,
+                'form': INLINE_FORM_PLACEHOLDER % form_id}
+        else:
+            embed = FORM_TAG_EMBED % {'suffix': suffix, 'id': form_id}
+        return FORM_TAG_SCRIPTS + embed if n == 0 else embed
+
+    return SHORTCODE_RE.sub(replace, body)
+
+
+def render_inline_forms(request, html):
+    """
+    Replaces the :data:`INLINE_FORM_PLACEHOLDER` of every form in ``html``
+    with the form's HTML (see
+    :func:`~dynamic_forms.fragments.render_unbound_form`). Each form is
+    rendered once, even if it is embedded several times.
+    """
+    from dynamic_forms.models import FormModel
+    rendered = {}
+
+    def replace(match):
+        form_id = match.group(1)
+        if form_id not in rendered:
+            try:
+                form_model = get_form_model(form_id, cache_missing=True)
+            except FormModel.DoesNotExist:
+                rendered[form_id] = ''
+            else:
+                rendered[form_id] = render_unbound_form(request, form_model)
+        return rendered[form_id]
+
+    return INLINE_FORM_PLACEHOLDER_RE.sub(replace, html)
+
+
+@register.assignment_tag(takes_context=True)
+def form_tag(context, body, inline=False):
+    """
+    tag usage {% form_tag body [inline=True] as body %}
+
+    Expands all ``[totc-form id=<form id>]`` shortcodes in ``body``. The
+    result is cached per process for
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT` seconds.
+
+    With ``inline=True`` the forms are rendered into the page instead of
+    being loaded with a second request. This requires the ``request`` in the
+    template context; without it, the forms are loaded as usual.
+    """
+    if '[totc-form' not in body:
+        return mark_safe(body)
+    request = context.get('request')
+    inline = inline and request is not None
+    if not settings.DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT:
+        html = expand_shortcodes(body, inline)
+    else:
+        key = (body, inline)
+        html = form_tag_cache.get(key)
+        if html is None:
+            html = expand_shortcodes(body, inline)
+            form_tag_cache.set(key, html)
+    if inline:
+        html = render_inline_forms(request, html)
+    return mark_safe(html)
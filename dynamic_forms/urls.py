@@ -2,12 +2,27 @@
 
 from django.conf.urls import url
 
-from .views import data_set_detail, form_handler, get_form, DynamicFormView
+from .views import (
+    choice_lookup, csrf_token, data_set_detail, form_handler, form_schema,
+    get_form, submit_batch_json, submit_json, DynamicFormView,
+    StreamingDynamicFormView,
+)
 
 urlpatterns = [
     url(r'show/(?P<display_key>[a-zA-Z0-9]{24})/$', data_set_detail,
         name='data-set-detail'),
     url(r'^forms/$', DynamicFormView.as_view(), name='dynamic_form_handler'),
-    url(r'^forms/(?P<form_id>[0-9]+)/$', DynamicFormView.as_view(), name='get_form')
+    url(r'^forms/(?P<form_id>[0-9]+)/$', DynamicFormView.as_view(), name='get_form'),
+    url(r'^forms/(?P<form_id>[0-9]+)/stream/$',
+        StreamingDynamicFormView.as_view(), name='stream-form'),
+    url(r'^forms/(?P<form_id>[0-9]+)/choices/(?P<field_name>[-\w]+)/$',
+        choice_lookup, name='choice-lookup'),
+    url(r'^forms/(?P<form_id>[0-9]+)/schema\.json$', form_schema,
+        name='form-schema'),
+    url(r'^forms/(?P<form_id>[0-9]+)/submit\.json$', submit_json,
+        name='submit-json'),
+    url(r'^forms/(?P<form_id>[0-9]+)/batch\.json$', submit_batch_json,
+        name='submit-batch-json'),
+    url(r'^csrf-token\.json$', csrf_token, name='csrf-token'),
 
 ]
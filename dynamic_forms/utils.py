@@ -37,19 +37,15 @@ def export_as_csv_action(description="Export selected form's data as a CSV file"
         based on http://djangosnippets.org/snippets/1697/
         """
         from dynamic_forms.models import FormModelData
+        from dynamic_forms.schema import get_form_schema
         if queryset.count() > 1:
             messages.error(request, "You can only export one form at a time.");
             return
         form_obj = queryset[0]
         form_data = FormModelData.objects.filter(form=form_obj)
         csv_filename = slugify("%s %s" % (form_obj.name, timezone.now()))
-        header_names = []
-        fields = form_obj.fields.all()
-        for field in fields:
-            if field.field_type in ('dynamic_forms.formfields.StartGroupField',
-                                    'dynamic_forms.formfields.EndGroupField'):
-                continue
-            header_names.append(field.label)
+        header_names = [field.label
+                        for field in get_form_schema(form_obj).data_fields]
 
         response = HttpResponse(content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename=%s.csv' % csv_filename
@@ -1,30 +1,104 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import hashlib
+import json
+from functools import wraps
+
+import six
 from django.contrib import messages
-from django.http import Http404
-from django.utils.translation import ugettext_lazy as _
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import force_bytes, force_text
+from django.utils.translation import get_language, ugettext_lazy as _
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import (
+    csrf_exempt, csrf_protect, ensure_csrf_cookie,
+)
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import DetailView, FormView, TemplateView
 from django.http import HttpResponse, HttpResponseRedirect
 
-from dynamic_forms.actions import action_registry
-from dynamic_forms.forms import FormModelForm
+from dynamic_forms.cache import get_form_cache_key, get_form_model
+from dynamic_forms.conf import settings
+from dynamic_forms.formfields import AutocompleteChoiceField
+from dynamic_forms.forms import FormModelForm, StreamingFormProxy
+from dynamic_forms.fragments import render_form_fragment
 from dynamic_forms.models import FormModelData, FormModel
-from dynamic_forms.utils import is_old_style_action
+from dynamic_forms.schema import get_form_schema
+from dynamic_forms.submission import SubmissionContext
+
+
+class ConditionalGetMixin(object):
+    """
+    Adds ``ETag`` and ``Last-Modified`` headers to ``GET`` and ``HEAD``
+    responses and answers matching conditional requests with ``304 Not
+    Modified`` without calling the view's ``get()``.
+
+    ``get_etag()`` and ``get_last_modified()`` return ``None`` if they cannot
+    tell, in which case ``get()`` is called as usual.
+    """
+
+    def get_etag(self):
+        return None
+
+    def get_last_modified(self):
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = super(ConditionalGetMixin, self).dispatch
+        if request.method in ('GET', 'HEAD'):
+            dispatch = condition(
+                etag_func=lambda request, *args, **kwargs: self.get_etag(),
+                last_modified_func=(
+                    lambda request, *args, **kwargs: self.get_last_modified()),
+            )(dispatch)
+        return dispatch(request, *args, **kwargs)
 
 
-class DynamicFormView(FormView):
+class DynamicFormView(ConditionalGetMixin, FormView):
 
     form_class = FormModelForm
 
     def dispatch(self, request, *args, **kwargs):
-        form_id = int(kwargs['form_id'])
         try:
-            self.form_model = FormModel.objects.get(id=form_id)
+            self.form_model = get_form_model(kwargs['form_id'])
         except:
             return HttpResponse('')
         return super(DynamicFormView, self).dispatch(request, *args, **kwargs)
 
+    def get(self, request, *args, **kwargs):
+        """
+        Renders the unbound form from the fragment cache, if it is enabled
+        (see :func:`~dynamic_forms.fragments.render_form_fragment`).
+        """
+        if not settings.DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT:
+            return super(DynamicFormView, self).get(request, *args, **kwargs)
+        html = render_form_fragment(request, self.form_model,
+            self.get_template_names(),
+            lambda: self.get_context_data(
+                form=self.get_form(self.get_form_class())))
+        return HttpResponse(html)
+
+    def get_etag(self):
+        """
+        The page embeds the visitor's CSRF token, so the token cookie is part
+        of the ``ETag`` besides the form's schema version and the template and
+        language it is rendered with. There is no ``ETag`` while messages
+        (:mod:`django.contrib.messages`) are pending, as the page may show
+        them and a ``304 Not Modified`` would hide them.
+        """
+        if len(messages.get_messages(self.request)):
+            return None
+        key = get_form_cache_key('page', self.form_model,
+            self.get_template_names(), get_language() or '',
+            self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+        return hashlib.md5(force_bytes(key)).hexdigest()
+
     def get_context_data(self, **kwargs):
         context = super(DynamicFormView, self).get_context_data(**kwargs)
         context.update({
@@ -33,6 +107,9 @@ class DynamicFormView(FormView):
         })
         return context
 
+    def get_form_class(self):
+        return get_form_schema(self.form_model).get_form_class()
+
     def get_form_kwargs(self):
         kwargs = super(DynamicFormView, self).get_form_kwargs()
         kwargs['model'] = self.form_model
@@ -52,21 +129,15 @@ class DynamicFormView(FormView):
 
     def form_valid(self, form):
         """
-        Instantiates an empty dict ``self.action_results`` that takes the
-        return values of every action that is called, unless the return value
-        of that action is ``None``.
+        Runs all actions of the form through a
+        :class:`~dynamic_forms.submission.SubmissionContext` sharing the
+        already loaded form model and schema. ``self.action_results`` takes
+        the return values of every action that is called, unless the return
+        value of that action is ``None``.
         """
-        self.action_results = {}
-        for actionkey in self.form_model.actions:
-            action = action_registry.get(actionkey)
-            if action is None:
-                continue
-            args = (self.form_model, form)
-
-            if not is_old_style_action(action):
-                args = args + (self.request,)
-
-            self.action_results[actionkey] = action(*args)
+        self.submission = SubmissionContext(self.form_model, self.request,
+            schema=form.schema)
+        self.action_results = self.submission.run_actions(form)
         messages.success(self.request,
             _('Thank you for submitting this form.'))
         return super(DynamicFormView, self).form_valid(form)
@@ -77,6 +148,29 @@ class DynamicFormView(FormView):
         return super(DynamicFormView, self).form_invalid(form)
 
 
+class StreamingDynamicFormView(DynamicFormView):
+    """
+    A :class:`DynamicFormView` that streams the unbound form for very large
+    forms. The template is rendered with a placeholder for the form, and the
+    form's rows are sent one by one as they are rendered. The template must
+    render the form with ``{{ form }}``, ``{{ form.as_table }}``,
+    ``{{ form.as_ul }}`` or ``{{ form.as_p }}``.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if settings.DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT:
+            # Cached fragments are complete already
+            return super(StreamingDynamicFormView, self).get(request, *args,
+                **kwargs)
+        form = StreamingFormProxy(self.get_form(self.get_form_class()))
+        html = render_to_string(self.get_template_names(),
+            self.get_context_data(form=form),
+            context_instance=RequestContext(request))
+        return StreamingHttpResponse(
+            (force_bytes(chunk) for chunk in form.stream(html)),
+            content_type='text/html; charset=%s' % settings.DEFAULT_CHARSET)
+
+
 class DynamicTemplateView(TemplateView):
 
     def dispatch(self, request, *args, **kwargs):
@@ -130,11 +224,32 @@ class DynamicDataMixin(object):
             **response_kwargs)
 
 
-class DynamicDataSetDetailView(DynamicDataMixin, DetailView):
+class DynamicDataSetDetailView(DynamicDataMixin, ConditionalGetMixin,
+        DetailView):
 
     model = FormModelData
     template_name = 'dynamic_forms/data_set.html'
 
+    def get_object(self, queryset=None):
+        # Shared by get_etag(), get_last_modified() and get()
+        if not hasattr(self, '_object'):
+            self._object = super(DynamicDataSetDetailView, self).get_object(
+                queryset)
+        return self._object
+
+    def get_etag(self):
+        try:
+            data = self.get_object()
+        except Http404:
+            return None
+        return '%d-%s' % (data.pk, data.submitted.strftime('%Y%m%d%H%M%S%f'))
+
+    def get_last_modified(self):
+        try:
+            return self.get_object().submitted
+        except Http404:
+            return None
+
 
 def form_handler(request):
     if request.method == 'POST':
@@ -148,7 +263,7 @@ def form_handler(request):
 def get_form(request, form_id=0):
     if request.method == 'GET':
         try:
-            form_model = FormModel.objects.get(id=form_id)
+            form_model = get_form_model(form_id)
         except:
             raise Http404
         kwargs = {'model': form_model}
@@ -158,4 +273,231 @@ def get_form(request, form_id=0):
     raise Http404
 
 
+def choice_lookup(request, form_id, field_name):
+    """
+    Returns the choices of an autocomplete choice field whose label starts
+    with the ``q`` query parameter as JSON. The results are paginated by
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_AUTOCOMPLETE_PAGE_SIZE` using the
+    1-based ``page`` query parameter.
+    """
+    try:
+        form_model = get_form_model(form_id)
+        field = get_form_schema(form_model).get_field(field_name)
+    except (FormModel.DoesNotExist, KeyError):
+        raise Http404
+    if not form_model.display:
+        raise Http404
+    if not isinstance(field.dynamic_field, AutocompleteChoiceField):
+        raise Http404
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    page_size = settings.DYNAMIC_FORMS_AUTOCOMPLETE_PAGE_SIZE
+    choices = field.dynamic_field.get_compiled_choices()
+    results, more = choices.search(request.GET.get('q', ''),
+        offset=(page - 1) * page_size, limit=page_size)
+    return JsonResponse({
+        'results': [{'value': k, 'label': l} for k, l in results],
+        'more': more,
+    })
+
+
+#: The ``max-age`` of schemas requested for their current version.
+SCHEMA_VERSIONED_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _get_displayed_form_model(form_id):
+    try:
+        form_model = get_form_model(form_id)
+    except FormModel.DoesNotExist:
+        return None
+    return form_model if form_model.display else None
+
+
+def _get_schema_etag(request, form_id):
+    form_model = _get_displayed_form_model(form_id)
+    if form_model is None:
+        return None
+    return hashlib.md5(force_bytes(
+        get_form_cache_key('schema-json', form_model))).hexdigest()
+
+
+def _get_schema_last_modified(request, form_id):
+    form_model = _get_displayed_form_model(form_id)
+    if form_model is None:
+        return None
+    return form_model.schema_modified_at
+
+
+@condition(etag_func=_get_schema_etag,
+    last_modified_func=_get_schema_last_modified)
+def form_schema(request, form_id):
+    """
+    Returns the schema of a displayed form as JSON (see
+    :meth:`~dynamic_forms.schema.FormSchema.to_dict`) for rendering the form
+    on the client.
+
+    Responses may be cached for
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_SCHEMA_MAX_AGE` seconds and are
+    revalidated with their ``ETag``. If the ``version`` query parameter is the
+    form's current schema version, the response may be cached for a year:
+    a changed form has a new version and thus a new URL.
+    """
+    form_model = _get_displayed_form_model(form_id)
+    if form_model is None:
+        raise Http404
+    response = HttpResponse(get_form_schema(form_model).to_json(),
+        content_type='application/json; charset=utf-8')
+    if request.GET.get('version') == str(form_model.schema_version):
+        max_age = SCHEMA_VERSIONED_MAX_AGE
+    else:
+        max_age = settings.DYNAMIC_FORMS_SCHEMA_MAX_AGE
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+@never_cache
+@ensure_csrf_cookie
+def csrf_token(request):
+    """
+    Returns the visitor's CSRF token as JSON and sets the CSRF cookie.
+    Pre-rendered forms, which cannot contain a token, fetch it when they are
+    submitted without a CSRF cookie (see :mod:`~dynamic_forms.prerender`).
+    """
+    return JsonResponse({'csrf_token': get_token(request)})
+
+
+def _get_error_map(errors):
+    return dict((name, [force_text(error) for error in field_errors])
+                for name, field_errors in six.iteritems(errors))
+
+
+def _json_errors(errors, status=400):
+    return JsonResponse({'errors': _get_error_map(errors)}, status=status)
+
+
+def _json_csrf_protect(view):
+    # Checks the CSRF token unless DYNAMIC_FORMS_JSON_CSRF_EXEMPT is set. The
+    # setting is read on every request, so the middleware must skip the view.
+    protected_view = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.DYNAMIC_FORMS_JSON_CSRF_EXEMPT:
+            return view(request, *args, **kwargs)
+        return protected_view(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+def _load_json_body(request, expected_type, type_error):
+    """
+    Returns a 2-tuple ``(data, error response)``, one of which is ``None``.
+    """
+    content_type = request.META.get('CONTENT_TYPE', '').split(';')[0]
+    if content_type.strip().lower() != 'application/json':
+        return None, _json_errors({NON_FIELD_ERRORS: [
+            _('The content type must be application/json.')]}, status=415)
+    try:
+        data = json.loads(request.body.decode(request.encoding or 'utf-8'))
+    except ValueError:
+        data = None
+    if not isinstance(data, expected_type):
+        return None, _json_errors({NON_FIELD_ERRORS: [type_error]})
+    return data, None
+
+
+def _get_stored_data_set(action_results):
+    for result in action_results.values():
+        if isinstance(result, FormModelData) and result.display_key:
+            return result
+    return None
+
+
+@_json_csrf_protect
+@require_POST
+def submit_json(request, form_id):
+    """
+    Validates the JSON object in the request body against a displayed form
+    and runs the form's actions. Returns ``201 Created`` with the
+    ``display_key`` of the stored data set if the form allows to display it,
+    else ``204 No Content``. Invalid data is answered with ``400 Bad
+    Request`` and a JSON object mapping field names, or ``__all__``, to
+    lists of error messages.
+
+    Requests must have the content type ``application/json`` and, unless
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_JSON_CSRF_EXEMPT` is set, pass
+    the CSRF token in the ``X-CSRFToken`` header.
+    """
+    form_model = _get_displayed_form_model(form_id)
+    if form_model is None:
+        raise Http404
+    data, error_response = _load_json_body(request, dict,
+        _('The request body must be a JSON object.'))
+    if error_response is not None:
+        return error_response
+
+    submission = SubmissionContext(form_model, request)
+    form = submission.get_form(data=data)
+    if not form.is_valid():
+        return _json_errors(form.errors)
+    submission.run_actions(form)
+
+    data_set = _get_stored_data_set(submission.action_results)
+    if data_set is not None:
+        response = JsonResponse({'display_key': data_set.display_key},
+            status=201)
+        response['Location'] = data_set.show_url
+        return response
+    return HttpResponse(status=204)
+
+
+@_json_csrf_protect
+@require_POST
+def submit_batch_json(request, form_id):
+    """
+    Like :func:`submit_json`, but takes a JSON array of up to
+    :data:`~dynamic_forms.conf.DYNAMIC_FORMS_BATCH_MAX_SIZE` submissions and
+    processes them at once (see
+    :meth:`~dynamic_forms.submission.SubmissionContext.submit_batch`).
+
+    Returns ``200 OK`` with a JSON object whose ``results`` hold one object
+    per submission, in order. Each result has the ``status`` that
+    :func:`submit_json` would have answered with and, accordingly, a
+    ``display_key`` or ``errors``.
+    """
+    form_model = _get_displayed_form_model(form_id)
+    if form_model is None:
+        raise Http404
+    data_list, error_response = _load_json_body(request, list,
+        _('The request body must be a JSON array.'))
+    if error_response is not None:
+        return error_response
+    if len(data_list) > settings.DYNAMIC_FORMS_BATCH_MAX_SIZE:
+        return _json_errors({NON_FIELD_ERRORS: [
+            _('At most %d submissions are allowed at once.') %
+            settings.DYNAMIC_FORMS_BATCH_MAX_SIZE]}, status=413)
+
+    items = [data for data in data_list if isinstance(data, dict)]
+    results = iter(SubmissionContext(form_model, request).submit_batch(items))
+    response = []
+    for data in data_list:
+        if not isinstance(data, dict):
+            response.append({'status': 400, 'errors': {NON_FIELD_ERRORS: [
+                force_text(_('The submission must be a JSON object.'))]}})
+            continue
+        form, action_results = next(results)
+        if action_results is None:
+            response.append({'status': 400,
+                'errors': _get_error_map(form.errors)})
+            continue
+        data_set = _get_stored_data_set(action_results)
+        if data_set is not None:
+            response.append({'status': 201,
+                'display_key': data_set.display_key})
+        else:
+            response.append({'status': 204})
+    return JsonResponse({'results': response})
+
+
 data_set_detail = DynamicDataSetDetailView.as_view()
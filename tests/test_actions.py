@@ -85,6 +85,15 @@ class TestActionRegistry(TestCase):
     def test_register_not_callable(self):
         self.assertRaises(ValueError, action_registry.register,
             'not a callable', 'Label')
+        self.assertRaises(ValueError, action_registry.register,
+            some_action, 'Label', batch='not a callable')
+
+    def test_register_batch(self):
+        def batch(context, forms):
+            return [None] * len(forms)
+        action_registry.register(some_action, 'My Label', batch=batch)
+        self.addCleanup(delattr, some_action, 'batch')
+        self.assertIs(action_registry.get(self.key3).batch, batch)
 
     def test_unregister(self):
         action_registry.register(some_action, 'My Label')
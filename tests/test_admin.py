@@ -179,6 +179,8 @@ class TestAdmin(TestCase):
             'max_length': 100,
             'required': False
         })
+        # The form and its field were saved, the schema changed once
+        self.assertEqual(FormModel.objects.get().schema_version, 3)
 
     def test_change_with_fields(self):
         form = FormModel.objects.create(name='Form', submit_url='/some-form/')
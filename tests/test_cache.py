@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from dynamic_forms.cache import (
+    LRUCache, form_model_cache, get_cache, get_form_model, single_flight,
+)
+from dynamic_forms.models import FormFieldModel, FormModel
+from dynamic_forms.schema import clear_schema_cache, get_form_schema
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = LRUCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 1), 1)
+        self.cache.set('a', 'A')
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_lru(self):
+        self.cache.set('a', 'A')
+        self.cache.set('b', 'B')
+        self.cache.get('a')
+        self.cache.set('c', 'C')
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 'C')
+
+    def test_ttl(self):
+        self.cache.set('a', 'A')
+        self.timer.now = 9
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_disabled(self):
+        cache = LRUCache(maxsize=0)
+        cache.set('a', 'A')
+        self.assertIsNone(cache.get('a'))
+
+
+class TestGetFormModel(TestCase):
+
+    def setUp(self):
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form')
+
+    def test_cached(self):
+        form_model = get_form_model(self.fm.pk)
+        self.assertEqual(form_model, self.fm)
+        with self.assertNumQueries(0):
+            self.assertIs(get_form_model(self.fm.pk), form_model)
+            self.assertIs(get_form_model(str(self.fm.pk)), form_model)
+
+    def test_missing(self):
+        self.assertRaises(FormModel.DoesNotExist, get_form_model,
+            self.fm.pk + 1)
+        self.assertEqual(len(form_model_cache), 0)
+
+    def test_cache_missing(self):
+        pk = self.fm.pk + 1
+        self.assertRaises(FormModel.DoesNotExist, get_form_model, pk,
+            cache_missing=True)
+        with self.assertNumQueries(0):
+            self.assertRaises(FormModel.DoesNotExist, get_form_model, pk)
+        fm = FormModel.objects.create(pk=pk, name='Created')
+        self.assertEqual(get_form_model(pk), fm)
+
+    def test_invalidate_on_change(self):
+        form_model = get_form_model(self.fm.pk)
+        self.fm.name = 'Changed'
+        self.fm.save()
+        self.assertEqual(get_form_model(self.fm.pk).name, 'Changed')
+
+        form_model = get_form_model(self.fm.pk)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Field',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        new_form_model = get_form_model(self.fm.pk)
+        self.assertIsNot(new_form_model, form_model)
+        self.assertEqual(new_form_model.schema_version,
+            form_model.schema_version + 1)
+
+    def test_invalidate_on_delete(self):
+        get_form_model(self.fm.pk)
+        pk = self.fm.pk
+        self.fm.delete()
+        self.assertRaises(FormModel.DoesNotExist, get_form_model, pk)
+
+
+class Builder(object):
+
+    def __init__(self, value='value', delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+class TestSingleFlight(TestCase):
+
+    def setUp(self):
+        self.cache = get_cache()
+        self.cache.clear()
+
+    def test_cached(self):
+        build = Builder()
+        self.assertEqual(single_flight('key', build, 10), 'value')
+        self.assertEqual(single_flight('key', build, 10), 'value')
+        self.assertEqual(build.calls, 1)
+        self.assertIsNone(self.cache.get('key:lock'))
+
+    def test_expired(self):
+        build = Builder()
+        single_flight('key', build, 10)
+        self.cache.set('key', (time.time() - 1, 'old'))
+        self.assertEqual(single_flight('key', build, 10), 'value')
+        self.assertEqual(build.calls, 2)
+
+    def test_serve_stale_while_locked(self):
+        build = Builder()
+        self.cache.set('key', (time.time() - 1, 'old'))
+        self.cache.add('key:lock', 1)
+        self.assertEqual(single_flight('key', build, 10), 'old')
+        self.assertEqual(build.calls, 0)
+
+    def test_build_error_releases_lock(self):
+        def build():
+            raise ValueError
+        self.assertRaises(ValueError, single_flight, 'key', build, 10)
+        self.assertIsNone(self.cache.get('key:lock'))
+
+    @override_settings(DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT=1)
+    def test_wait_for_builder(self):
+        self.cache.add('key:lock', 1)
+
+        def build_elsewhere():
+            time.sleep(0.2)
+            self.cache.set('key', (time.time() + 10, 'other'))
+        thread = threading.Thread(target=build_elsewhere)
+        thread.start()
+        build = Builder()
+        self.assertEqual(single_flight('key', build, 10), 'other')
+        thread.join()
+        self.assertEqual(build.calls, 0)
+
+    @override_settings(DYNAMIC_FORMS_BUILD_LOCK_TIMEOUT=0.2)
+    def test_stuck_builder(self):
+        self.cache.add('key:lock', 1, 10)
+        build = Builder()
+        self.assertEqual(single_flight('key', build, 10), 'value')
+        self.assertEqual(build.calls, 1)
+
+    def test_concurrent(self):
+        build = Builder(delay=0.2)
+        results = []
+
+        def worker():
+            results.append(single_flight('key', build, 10))
+        threads = [threading.Thread(target=worker) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(build.calls, 1)
+
+
+class TestSharedSchemaCache(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        clear_schema_cache()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+
+    def test_shared_between_processes(self):
+        schema = get_form_schema(self.fm)
+        schema.get_form_class()
+        # Simulate another process with an empty in-process cache
+        clear_schema_cache()
+        with self.assertNumQueries(0):
+            other = get_form_schema(self.fm)
+        self.assertIsNot(other, schema)
+        self.assertEqual([f.name for f in other], ['name'])
+        form = other.get_form_class()(model=self.fm, data={'name': 'Jane'})
+        self.assertTrue(form.is_valid())
+
+    def test_new_version(self):
+        get_form_schema(self.fm)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField')
+        clear_schema_cache()
+        self.assertEqual([f.name for f in get_form_schema(self.fm)],
+            ['name', 'mail'])
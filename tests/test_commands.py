@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from .utils import BrokenField
+
+from dynamic_forms import formfields, prerender
+from dynamic_forms.cache import form_model_cache, get_cache
+from dynamic_forms.models import FormFieldModel, FormModel
+from dynamic_forms.prerender import _write_file
+from dynamic_forms.schema import (
+    clear_schema_cache, get_form_schema, get_schema_cache_key,
+)
+
+
+class TestWarmupCommand(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        clear_schema_cache()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.hidden = FormModel.objects.create(name='Hidden', display=False)
+
+    def test_warmup(self):
+        out = StringIO()
+        call_command('dynamic_forms_warmup', stdout=out)
+        self.assertIn('Form (%d): 1 fields in' % self.fm.pk, out.getvalue())
+        self.assertIn('Warmed up 1 forms', out.getvalue())
+        self.assertNotIn('Hidden', out.getvalue())
+
+        self.assertIsNotNone(get_cache().get(get_schema_cache_key(self.fm)))
+        self.assertIsNone(get_cache().get(get_schema_cache_key(self.hidden)))
+        clear_schema_cache()
+        with self.assertNumQueries(0):
+            get_form_schema(self.fm)
+
+    def test_invalid_processes(self):
+        self.assertRaises(CommandError, call_command, 'dynamic_forms_warmup',
+            processes=0, stdout=StringIO())
+
+    def test_broken_field_type(self):
+        err = StringIO()
+        formfields.formfield_registry.register(BrokenField)
+        try:
+            self.assertRaises(CommandError, call_command,
+                'dynamic_forms_warmup', stdout=StringIO(), stderr=err)
+        finally:
+            formfields.formfield_registry.unregister('tests.utils.BrokenField')
+        self.assertIn('tests.utils.BrokenField', err.getvalue())
+        # The forms are warmed up regardless
+        self.assertIsNotNone(get_cache().get(get_schema_cache_key(self.fm)))
+
+
+@contextmanager
+def record_renders():
+    calls = []
+    original = prerender.prerender_form
+
+    def prerender_form(form_model, directory):
+        calls.append(form_model.pk)
+        return original(form_model, directory)
+
+    prerender.prerender_form = prerender_form
+    try:
+        yield calls
+    finally:
+        prerender.prerender_form = original
+
+
+class TestPrerenderCommand(TestCase):
+
+    def setUp(self):
+        clear_schema_cache()
+        form_model_cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.hidden = FormModel.objects.create(name='Hidden', display=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with io.open(os.path.join(self.directory, name),
+                encoding='utf-8') as f:
+            return f.read()
+
+    def test_prerender(self):
+        out = StringIO()
+        call_command('dynamic_forms_prerender', output_dir=self.directory,
+            stdout=out)
+        self.assertIn('Rendered 1 forms', out.getvalue())
+        self.assertEqual(sorted(os.listdir(self.directory)),
+            ['%d.html' % self.fm.pk, '%d.json' % self.fm.pk])
+
+        html = self.read('%d.html' % self.fm.pk)
+        self.assertIn('<form id="dynamic-form"', html)
+        self.assertIn('name="name"', html)
+        self.assertNotIn("name='csrfmiddlewaretoken'", html)
+        self.assertIn("xhr.open('GET', '/dynamic_forms/csrf-token.json')",
+            html)
+        self.assertIn("getCookie('csrftoken')", html)
+
+        schema = json.loads(self.read('%d.json' % self.fm.pk))
+        self.assertEqual(schema['id'], self.fm.pk)
+        self.assertEqual(schema['version'], self.fm.schema_version)
+        self.assertEqual([f['name'] for f in schema['fields']], ['name'])
+
+    def test_write_error(self):
+        path = os.path.join(self.directory, 'form.html')
+        # Text files only take text
+        self.assertRaises(TypeError, _write_file, path, b'<form>')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_no_directory(self):
+        self.assertRaises(CommandError, call_command,
+            'dynamic_forms_prerender', stdout=StringIO())
+
+    def test_on_schema_change(self):
+        with override_settings(DYNAMIC_FORMS_PRERENDER_DIR=self.directory):
+            FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+                field_type='dynamic_forms.formfields.EmailField')
+            self.assertIn('name="mail"', self.read('%d.html' % self.fm.pk))
+            self.assertNotIn('%d.html' % self.hidden.pk,
+                os.listdir(self.directory))
+
+            self.fm.display = False
+            self.fm.save()
+            self.assertEqual(os.listdir(self.directory), [])
+
+    def test_render_error(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('dynamic_forms.prerender')
+        logger.addHandler(handler)
+        try:
+            with override_settings(
+                    DYNAMIC_FORMS_PRERENDER_DIR=self.directory):
+                # A choice field without choices cannot be rendered yet
+                FormFieldModel.objects.create(parent_form=self.fm,
+                    label='Pick',
+                    field_type='dynamic_forms.formfields.ChoiceField')
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_once_per_request(self):
+        with override_settings(DYNAMIC_FORMS_PRERENDER_DIR=self.directory):
+            with record_renders() as calls:
+                prerender.request_started_receiver(sender=None)
+                try:
+                    for label in ('Mail', 'Phone'):
+                        FormFieldModel.objects.create(parent_form=self.fm,
+                            label=label,
+                            field_type='dynamic_forms.formfields.EmailField')
+                    self.assertEqual(calls, [])
+                finally:
+                    prerender.request_finished_receiver(sender=None)
+        self.assertEqual(calls, [self.fm.pk])
+        html = self.read('%d.html' % self.fm.pk)
+        self.assertIn('name="mail"', html)
+        self.assertIn('name="phone"', html)
+
+    def test_delete_in_request(self):
+        with override_settings(DYNAMIC_FORMS_PRERENDER_DIR=self.directory):
+            prerender.prerender_form(self.fm, self.directory)
+            with record_renders() as calls:
+                prerender.request_started_receiver(sender=None)
+                try:
+                    self.fm.delete()
+                finally:
+                    prerender.request_finished_receiver(sender=None)
+        self.assertEqual(calls, [])
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from dynamic_forms.cache import form_model_cache, get_cache
+from dynamic_forms.fragments import CSRF_TOKEN_PLACEHOLDER
+from dynamic_forms.models import FormFieldModel, FormModel
+from dynamic_forms.templatetags.form_tag import (
+    INLINE_FORM_PLACEHOLDER, expand_shortcodes, form_tag, form_tag_cache,
+)
+
+
+class TestFormTag(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        form_tag_cache.clear()
+        self.fm1 = FormModel.objects.create(name='Form 1')
+        self.fm2 = FormModel.objects.create(name='Form 2')
+        self.body = 'Intro [totc-form id=%d] middle [totc-form id=%d] end' % (
+            self.fm1.pk, self.fm2.pk)
+
+    def test_no_shortcode(self):
+        self.assertEqual(form_tag(Context(), '<p>Text</p>'), '<p>Text</p>')
+
+    def test_expand(self):
+        html = expand_shortcodes(self.body)
+        self.assertTrue(html.startswith('Intro '))
+        self.assertTrue(html.endswith(' end'))
+        self.assertNotIn('[totc-form', html)
+        self.assertEqual(html.count('jquery.js'), 1)
+        # The first form keeps the ids it had on its own
+        self.assertIn('id="form-insertion"', html)
+        self.assertIn('id="form-thanks"', html)
+        self.assertIn('id="form-insertion-1"', html)
+        self.assertIn('id="form-thanks-1"', html)
+        self.assertNotIn('form-insertion-0', html)
+        self.assertIn("'/dynamic_forms/forms/%d/'" % self.fm1.pk, html)
+        self.assertIn("'/dynamic_forms/forms/%d/'" % self.fm2.pk, html)
+
+    def test_template(self):
+        template = Template('{% load form_tag %}{% form_tag body as body %}'
+            '{{ body }}')
+        html = template.render(Context({'body': self.body}))
+        self.assertEqual(html, expand_shortcodes(self.body))
+
+    def test_single_form(self):
+        html = expand_shortcodes('[totc-form id=%d]' % self.fm1.pk)
+        self.assertIn('<div id="form-insertion" class="form-insertion">', html)
+        self.assertIn("$('#form-thanks')", html)
+
+    def test_cached(self):
+        with self.assertNumQueries(0):
+            html = form_tag(Context(), self.body)
+        self.assertEqual(form_tag_cache.get((self.body, False)), html)
+        self.assertEqual(form_tag(Context(), self.body), html)
+
+    def test_missing_form(self):
+        body = '[totc-form id=0]'
+        with self.assertNumQueries(0):
+            self.assertEqual(form_tag(Context(), body),
+                expand_shortcodes(body))
+
+    @override_settings(DYNAMIC_FORMS_FORM_TAG_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.assertEqual(form_tag(Context(), self.body), expand_shortcodes(self.body))
+        self.assertEqual(len(form_tag_cache), 0)
+
+
+class TestInlineFormTag(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        form_tag_cache.clear()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.body = 'Intro [totc-form id=%d] end [totc-form id=0]' % self.fm.pk
+        self.template = Template('{% load form_tag %}'
+            '{% form_tag body inline=True as body %}{{ body }}')
+
+    def render(self, request=None):
+        if request is None:
+            request = RequestFactory().get('/')
+        request.META['CSRF_COOKIE'] = 'a' * 32
+        return self.template.render(Context({'body': self.body,
+            'request': request}))
+
+    def test_inline(self):
+        html = self.render()
+        self.assertIn('name="name"', html)
+        self.assertIn("value='%s'" % ('a' * 32), html)
+        self.assertNotIn('xhr.open', html)
+        self.assertNotIn('<!--dynamic-forms-inline-form', html)
+        self.assertEqual(html.count('class="form-insertion"'), 2)
+
+        # The expanded body is cached with placeholders for the forms
+        self.assertIn(INLINE_FORM_PLACEHOLDER % self.fm.pk,
+            form_tag_cache.get((self.body, True)))
+
+    @override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_fragment_cache(self):
+        self.body = 'Intro [totc-form id=%d]' % self.fm.pk
+        html = self.render()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), html)
+        self.assertIn("value='%s'" % ('a' * 32), html)
+        self.assertNotIn(CSRF_TOKEN_PLACEHOLDER, html)
+
+    def test_post(self):
+        # The page's own POST data does not bind the embedded form
+        html = self.render(RequestFactory().post('/', {'name': 'Jane',
+            'other': 'value'}))
+        self.assertIn('name="name"', html)
+        self.assertNotIn('Jane', html)
+        self.assertNotIn('errorlist', html)
+
+    @override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_post_fragment_cache(self):
+        self.render(RequestFactory().post('/', {'other': 'value'}))
+        html = self.render()
+        self.assertIn('name="name"', html)
+        self.assertNotIn('errorlist', html)
+
+    def test_without_request(self):
+        html = self.template.render(Context({'body': self.body}))
+        self.assertEqual(html, expand_shortcodes(self.body))
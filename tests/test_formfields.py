@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from contextlib import contextmanager
 from copy import deepcopy
 
 import six
 from django import forms
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 
+from .utils import BrokenField
+
+from dynamic_forms import formfields
+from dynamic_forms.checks import check_formfield_registry
+from dynamic_forms.fields import IndexedChoiceField
 from dynamic_forms.formfields import (
-    BaseDynamicFormField, BooleanField, ChoiceField, DateField, DateTimeField,
-    EmailField, IntegerField, MultiLineTextField, SingleLineTextField,
-    TimeField, format_display_label, formfield_registry as registry,
+    AutocompleteChoiceField, BaseDynamicFormField, BooleanField, ChoiceField,
+    CompiledChoices, DateField, DateTimeField, EmailField, FieldOption,
+    IntegerField, MultiLineTextField, SingleLineTextField, TimeField,
+    format_display_label, formfield_registry as registry,
 )
 
 
@@ -46,6 +54,22 @@ class NotAField(object):
     cls = 'django.forms.CharField'
 
 
+@contextmanager
+def mock_load_class():
+    calls = []
+    original = formfields.load_class_from_string
+
+    def load_class_from_string(cls_string):
+        calls.append(cls_string)
+        return original(cls_string)
+
+    formfields.load_class_from_string = load_class_from_string
+    try:
+        yield calls
+    finally:
+        formfields.load_class_from_string = original
+
+
 class TestUtils(TestCase):
 
     def test_format_display_label(self):
@@ -166,9 +190,21 @@ class TestGenericDynamicFormFields(TestCase):
         # This check implies, that neither Meta attributes starting with a _
         # not those part of the _exclude list are available
         self.assertEqual(metafield.options, {
-            'max_length': [int, None, forms.IntegerField],
+            'max_length': (int, None, forms.IntegerField),
         })
 
+    def test_options_not_shared(self):
+        field1 = CharField('name', 'Label', required=False)
+        field2 = CharField('name', 'Label')
+        self.assertFalse(field1.get_option('required'))
+        self.assertTrue(field2.get_option('required'))
+        self.assertEqual(field1.options['required'],
+            FieldOption(bool, False, forms.NullBooleanField))
+        self.assertEqual(CharField._meta['required'],
+            FieldOption(bool, True, forms.NullBooleanField))
+        self.assertFalse(field1.construct().required)
+        self.assertTrue(field2.construct().required)
+
     def test_options_invalid(self):
         self.assertRaises(KeyError, CharField, 'name', 'Label', something=123)
         self.assertRaises(KeyError, CharField, 'name', 'Label', something=123,
@@ -178,6 +214,36 @@ class TestGenericDynamicFormFields(TestCase):
         self.assertRaises(TypeError, CharField, 'name', 'Label', help_text=42)
 
 
+class TestResolveClasses(TestCase):
+
+    def test_resolve_from_string(self):
+        self.assertEqual(WidgetedField.resolve_classes(),
+            (forms.CharField, forms.Textarea))
+        self.assertEqual(Char2Field.resolve_classes(), (forms.CharField, None))
+
+    def test_resolve_cached(self):
+        resolved = Char2Field.resolve_classes()
+        self.assertIs(Char2Field.__dict__['_resolved_classes'], resolved)
+        with mock_load_class() as calls:
+            Char2Field('name', 'Label').construct()
+        self.assertEqual(calls, [])
+
+    def test_resolve_broken(self):
+        self.assertRaises(ImproperlyConfigured, BrokenField.resolve_classes)
+
+    def test_system_check(self):
+        self.assertEqual(check_formfield_registry(), [])
+        key = 'tests.utils.BrokenField'
+        formfields.formfield_registry.register(BrokenField)
+        try:
+            errors = check_formfield_registry()
+        finally:
+            formfields.formfield_registry.unregister(key)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].id, 'dynamic_forms.E001')
+        self.assertIs(errors[0].obj, BrokenField)
+
+
 class TestChoiceField(TestCase):
 
     def test_options_valid(self):
@@ -196,3 +262,85 @@ amet equm"""
         self.assertTrue(isinstance(formfield, forms.ChoiceField))
         self.assertEqual(formfield.choices, [('Lorem ipsum', 'Lorem ipsum'),
             ('dolor sit', 'dolor sit'), ('amet equm', 'amet equm')])
+
+    def test_compiled_choices(self):
+        dynamicfield = ChoiceField('name', 'Label', choices='a\nb\n\nc')
+        compiled = dynamicfield.get_compiled_choices()
+        self.assertIsInstance(compiled, CompiledChoices)
+        self.assertIs(dynamicfield.get_compiled_choices(), compiled)
+        self.assertEqual(compiled.choices,
+            (('', '---'), ('a', 'a'), ('b', 'b'), ('c', 'c')))
+        self.assertEqual(compiled.values, frozenset(['a', 'b', 'c']))
+        self.assertIn('b', compiled)
+        self.assertNotIn('', compiled)
+
+        dynamicfield.set_options(choices='d')
+        self.assertEqual(dynamicfield.get_compiled_choices().values,
+            frozenset(['d']))
+
+    def test_indexed_choice_field(self):
+        dynamicfield = ChoiceField('name', 'Label', choices='a\nb')
+        formfield = dynamicfield.construct()
+        self.assertIsInstance(formfield, IndexedChoiceField)
+        compiled = dynamicfield.get_compiled_choices()
+        self.assertIs(formfield.choices, compiled.choices)
+        self.assertIs(formfield.valid_values, compiled.values)
+
+        copied = deepcopy(formfield)
+        self.assertIs(copied.choices, compiled.choices)
+        self.assertIs(copied.widget.choices, compiled.choices)
+        self.assertEqual(copied.clean('b'), 'b')
+        self.assertRaises(forms.ValidationError, copied.clean, 'x')
+        self.assertRaises(forms.ValidationError, copied.clean, '')
+
+    def test_indexed_choice_field_optgroups(self):
+        formfield = IndexedChoiceField(choices=[
+            ('a', 'A'), ('Group', [('b', 'B'), (1, 'One')]),
+        ])
+        self.assertEqual(formfield.valid_values, frozenset(['a', 'b', '1']))
+        self.assertEqual(formfield.clean(1), '1')
+
+
+class TestValidationRules(TestCase):
+
+    def test_required(self):
+        self.assertEqual(BooleanField('b', 'B').get_validation_rules(),
+            {'required': True})
+        self.assertEqual(BooleanField('b', 'B',
+            required=False).get_validation_rules(), {})
+
+    def test_formats(self):
+        for cls, fmt in ((DateField, 'date'), (DateTimeField, 'datetime'),
+                         (EmailField, 'email'), (TimeField, 'time')):
+            self.assertEqual(cls('f', 'F',
+                required=False).get_validation_rules(), {'format': fmt})
+
+    def test_single_line_text(self):
+        field = SingleLineTextField('t', 'T', max_length=10, min_length=2)
+        self.assertEqual(field.get_validation_rules(),
+            {'required': True, 'max_length': 10, 'min_length': 2})
+        field = MultiLineTextField('t', 'T', required=False)
+        self.assertEqual(field.get_validation_rules(), {})
+
+    def test_integer(self):
+        field = IntegerField('i', 'I', min_value=0, required=False)
+        self.assertEqual(field.get_validation_rules(),
+            {'format': 'integer', 'min_value': 0})
+
+    def test_choices(self):
+        # The select only offers valid choices
+        field = ChoiceField('c', 'C', choices='a\nb')
+        self.assertEqual(field.get_validation_rules(), {'required': True})
+        field = AutocompleteChoiceField('c', 'C', choices='a\nb')
+        self.assertEqual(field.get_validation_rules(), {'required': True})
+
+    def test_widget_attrs(self):
+        form = forms.Form()
+        IntegerField('i', 'I', max_value=5).contribute_to_form(form)
+        self.assertEqual(form.fields['i'].widget.attrs['data-rules'],
+            '{"format":"integer","max_value":5,"required":true}')
+        BooleanField('b', 'B', required=False).contribute_to_form(form)
+        self.assertNotIn('data-rules', form.fields['b'].widget.attrs)
+        ChoiceField('c', 'C', choices='a\nb').contribute_to_form(form)
+        self.assertEqual(form.fields['c'].widget.attrs['data-rules'],
+            '{"required":true}')
@@ -3,16 +3,19 @@ from __future__ import unicode_literals
 
 from collections import OrderedDict
 
+from django import forms
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils import translation
 from django.utils.decorators import classonlymethod
 
 from dynamic_forms.formfields import (
     SingleLineTextField, formfield_registry as registry,
 )
-from dynamic_forms.forms import FormModelForm
+from dynamic_forms.forms import FormModelForm, RenderPlan
 from dynamic_forms.models import FormFieldModel, FormModel
+from dynamic_forms.schema import get_form_schema
 
 
 class CharField(SingleLineTextField):
@@ -112,3 +115,149 @@ class TestForms(TestCase):
         response = self.client.post(reverse('admin:dynamic_forms_formmodel_add'), data)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, '<li>This field is required.</li>', count=1, html=True)
+
+
+class TestFormModelFormFactory(TestCase):
+
+    def setUp(self):
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Text',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Bool',
+            field_type='dynamic_forms.formfields.BooleanField',
+            position=2, _options='{"required": false}')
+
+    def test_form_class(self):
+        schema = get_form_schema(self.fm)
+        form_class = schema.get_form_class()
+        self.assertTrue(issubclass(form_class, FormModelForm))
+        self.assertIs(schema.get_form_class(), form_class)
+        self.assertEqual(list(form_class.base_fields), ['text', 'bool'])
+
+        text = form_class.base_fields['text']
+        self.assertEqual(text.widget.attrs, {
+            'class': 'form-control',
+            'data-rules': '{"required":true}',
+            'required': 'true',
+        })
+        self.assertEqual(form_class.base_fields['bool'].widget.attrs, {})
+
+        form = form_class(model=self.fm)
+        self.assertEqual(list(form.fields), ['text', 'bool'])
+        self.assertIsNot(form.fields['text'], text)
+
+    def test_direct_instantiation(self):
+        form = FormModelForm(model=self.fm)
+        self.assertEqual(list(form.fields), ['text', 'bool'])
+        self.assertEqual(list(FormModelForm.base_fields), [])
+
+    def test_new_class_per_version(self):
+        form_class = get_form_schema(self.fm).get_form_class()
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField', position=3)
+        new_class = get_form_schema(self.fm).get_form_class()
+        self.assertIsNot(new_class, form_class)
+        self.assertEqual(list(new_class.base_fields),
+            ['text', 'bool', 'mail'])
+
+        # An outdated class only uses the fields of the current schema
+        form = form_class(model=self.fm)
+        self.assertEqual(list(form.fields), ['text', 'bool', 'mail'])
+
+
+class StyledForm(FormModelForm):
+    error_css_class = 'error'
+    required_css_class = 'required'
+    secret = forms.CharField(widget=forms.HiddenInput)
+
+
+class DjangoRenderedForm(StyledForm):
+    # Renders without a render plan, like any other Django form
+    _html_output = forms.BaseForm.__dict__['_html_output']
+
+
+class TestRenderPlan(TestCase):
+
+    def setUp(self):
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Text & more',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=1, _options='{"help_text": "Some <b>help</b>"}')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField',
+            position=2, _options='{"required": false}')
+
+    def assert_same_output(self, **kwargs):
+        for method in ('as_table', 'as_ul', 'as_p'):
+            form = StyledForm(model=self.fm, **kwargs)
+            reference = DjangoRenderedForm(model=self.fm, **kwargs)
+            self.assertEqual(getattr(form, method)(),
+                getattr(reference, method)())
+
+    def test_unbound(self):
+        self.assert_same_output()
+        self.assert_same_output(auto_id=False)
+        self.assert_same_output(prefix='pre', label_suffix='!')
+        self.assert_same_output(initial={'mail': 'a@example.com'})
+
+    def test_bound(self):
+        self.assert_same_output(data={'text-more': 'Text',
+            'mail': 'a@example.com', 'secret': 'x'})
+        self.assert_same_output(data={'text-more': '', 'mail': 'invalid'})
+
+    def test_groups(self):
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=0, _options='{"help_text": "Intro"}')
+        FormFieldModel.objects.create(parent_form=self.fm, label='End',
+            field_type='dynamic_forms.formfields.EndGroupField',
+            position=3)
+        html = FormModelForm(model=FormModel.objects.get(pk=self.fm.pk)).as_p()
+        self.assertTrue(html.startswith(
+            '<div class="form-group"><h3>Group</h3>\n<p>Intro</p>\n<p>'))
+        self.assertTrue(html.endswith('</p>\n</div>'))
+        self.assertIn('<label for="id_text-more">Text &amp; more:</label>', html)
+
+    def test_groups_not_form_fields(self):
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=0)
+        FormFieldModel.objects.create(parent_form=self.fm, label='End',
+            field_type='dynamic_forms.formfields.EndGroupField',
+            position=3)
+        fm = FormModel.objects.get(pk=self.fm.pk)
+        form = FormModelForm(model=fm, data={'text-more': 'Text'})
+        self.assertEqual(list(form.fields), ['text-more', 'mail'])
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data, {'text-more': 'Text', 'mail': ''})
+
+    def test_iter(self):
+        for kwargs in ({}, {'data': {'text-more': '', 'mail': 'invalid'}}):
+            for method in ('as_table', 'as_ul', 'as_p'):
+                form = StyledForm(model=self.fm, **kwargs)
+                chunks = list(getattr(form, 'iter_' + method)())
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(''.join(chunks), getattr(form, method)())
+
+    def test_cached(self):
+        schema = get_form_schema(self.fm)
+        StyledForm(model=self.fm).as_p()
+        self.assertEqual(len(schema._render_plans), 1)
+        plan = list(schema._render_plans.values())[0]
+        self.assertIsInstance(plan, RenderPlan)
+
+        StyledForm(model=self.fm, data={'text-more': 'x'}).as_p()
+        self.assertEqual(list(schema._render_plans.values()), [plan])
+
+        StyledForm(model=self.fm).as_table()
+        StyledForm(model=self.fm, auto_id='f_%s').as_p()
+        with translation.override('de'):
+            StyledForm(model=self.fm).as_p()
+        self.assertEqual(len(schema._render_plans), 4)
+
+    def test_disabled(self):
+        class UncachedForm(StyledForm):
+            use_render_plan = False
+        UncachedForm(model=self.fm).as_p()
+        self.assertEqual(get_form_schema(self.fm)._render_plans, {})
@@ -10,7 +10,9 @@ from django.db.utils import IntegrityError
 from django.test import TestCase
 from django.utils import timezone
 
+from dynamic_forms import models
 from dynamic_forms.models import FormFieldModel, FormModel, FormModelData
+from dynamic_forms.signals import schema_changed
 
 
 class TestModels(TestCase):
@@ -70,6 +72,117 @@ class TestModels(TestCase):
         )
 
 
+class TestSchemaVersion(TestCase):
+
+    def setUp(self):
+        self.fm = FormModel.objects.create(name='Form')
+
+    def get_version(self):
+        return FormModel.objects.get(pk=self.fm.pk).schema_version
+
+    def test_initial(self):
+        self.assertEqual(self.fm.schema_version, 1)
+        self.assertIsNotNone(self.fm.schema_modified_at)
+
+    def test_form_save(self):
+        modified_at = self.fm.schema_modified_at
+        self.fm.save()
+        self.assertEqual(self.fm.schema_version, 2)
+        self.assertEqual(self.get_version(), 2)
+        self.assertGreaterEqual(self.fm.schema_modified_at, modified_at)
+
+    def test_stale_save(self):
+        stale = FormModel.objects.get(pk=self.fm.pk)
+        self.fm.save()
+        self.fm.save()
+        self.assertEqual(self.get_version(), 3)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(stale.schema_version, 4)
+        fm = FormModel.objects.get(pk=self.fm.pk)
+        self.assertEqual((fm.name, fm.schema_version), ('Renamed', 4))
+
+    def test_field_changes(self):
+        ff = FormFieldModel.objects.create(parent_form=self.fm, label='F',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.assertEqual(self.get_version(), 2)
+        self.assertEqual(self.fm.schema_version, 2)
+
+        ff.position = 5
+        ff.save()
+        self.assertEqual(self.get_version(), 3)
+
+        FormFieldModel.objects.get(pk=ff.pk).delete()
+        self.assertEqual(self.get_version(), 4)
+        self.assertEqual(FormModel.objects.get(pk=self.fm.pk).fields.count(), 0)
+
+    def test_schema_changed_signal(self):
+        calls = []
+
+        def receiver(sender, form_id, version, **kwargs):
+            calls.append((form_id, version))
+
+        pk = self.fm.pk
+        schema_changed.connect(receiver)
+        try:
+            self.fm.save()
+            self.fm.delete()
+        finally:
+            schema_changed.disconnect(receiver)
+        self.assertEqual(calls, [(pk, 2), (pk, None)])
+
+    def test_delete_with_fields(self):
+        for label in ('A', 'B'):
+            FormFieldModel.objects.create(parent_form=self.fm, label=label,
+                field_type='dynamic_forms.formfields.SingleLineTextField')
+        calls = []
+
+        def receiver(sender, form_id, version, **kwargs):
+            calls.append((form_id, version))
+
+        pk = self.fm.pk
+        schema_changed.connect(receiver)
+        try:
+            self.fm.delete()
+        finally:
+            schema_changed.disconnect(receiver)
+        # The fields are deleted along with the form, not one by one
+        self.assertEqual(calls, [(pk, None)])
+        self.assertFalse(FormFieldModel.objects.filter(parent_form=pk).exists())
+
+    def test_deferred_changes(self):
+        calls = []
+
+        def receiver(sender, form_id, version, **kwargs):
+            calls.append((form_id, version))
+
+        pk = self.fm.pk
+        schema_changed.connect(receiver)
+        try:
+            with models.defer_schema_changes():
+                self.fm.save()
+                for label in ('A', 'B'):
+                    FormFieldModel.objects.create(parent_form=self.fm,
+                        label=label,
+                        field_type='dynamic_forms.formfields.SingleLineTextField')
+                self.assertEqual(self.get_version(), 1)
+        finally:
+            schema_changed.disconnect(receiver)
+        self.assertEqual(calls, [(pk, 2)])
+        self.assertEqual(self.get_version(), 2)
+
+    def test_deferred_changes_error(self):
+        with self.assertRaises(ValueError):
+            with models.defer_schema_changes():
+                self.fm.save()
+                raise ValueError
+        self.assertEqual(self.get_version(), 1)
+        # The deferral ends with the block, even after an exception
+        FormFieldModel.objects.create(parent_form=self.fm, label='F',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.assertEqual(self.get_version(), 2)
+
+
 class TestFormFieldModel(TestCase):
 
     def setUp(self):
@@ -297,3 +410,24 @@ class TestFormModelData(TestCase):
             fmd.show_url_link,
             '<a href="/dynamic_forms/show/{0}/">{0}</a>'.format(fmd.display_key)
         )
+
+
+class TestDisplayKeys(TestCase):
+
+    def setUp(self):
+        self.fm = FormModel.objects.create(name='Form', allow_display=True)
+
+    def test_generate_display_keys(self):
+        taken = FormModelData.objects.create(form=self.fm, value='{}')
+        keys = iter([taken.display_key, 'a' * 24, 'b' * 24])
+
+        get_random_string = models.get_random_string
+        models.get_random_string = lambda length: next(keys)
+        try:
+            with self.assertNumQueries(2):
+                generated = FormModelData.generate_display_keys(2)
+        finally:
+            models.get_random_string = get_random_string
+        self.assertEqual(sorted(generated), ['a' * 24, 'b' * 24])
+        self.assertEqual(len(set(FormModelData.generate_display_keys(50))),
+            50)
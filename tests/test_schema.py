@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import pickle
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import six
+
+from dynamic_forms.cache import get_cache
+from dynamic_forms.forms import FormModelForm
+from dynamic_forms.models import ChoiceSet, FormFieldModel, FormModel
+from dynamic_forms.schema import (
+    FormSchema, clear_schema_cache, get_compiled_choice_set, get_form_schema,
+)
+
+
+class TestFormSchema(TestCase):
+
+    def setUp(self):
+        clear_schema_cache()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Label 1',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=2, _options='{"required": false}')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Label 2',
+            field_type='dynamic_forms.formfields.ChoiceField',
+            position=3, _options='{"choices": "a\\nb"}')
+
+    def test_from_form_model(self):
+        schema = FormSchema.from_form_model(self.fm)
+        self.assertEqual([f.name for f in schema],
+            ['group', 'label-1', 'label-2'])
+        field = schema.get_field('label-1')
+        self.assertEqual(field.label, 'Label 1')
+        self.assertEqual(field.options, {'required': False})
+        self.assertEqual(field.group, 'group')
+        self.assertIsNone(schema.get_field('group').group)
+        self.assertRaises(KeyError, schema.get_field, 'missing')
+
+    def test_groups(self):
+        FormFieldModel.objects.create(parent_form=self.fm, label='Inner',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=4)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField', position=5)
+        FormFieldModel.objects.create(parent_form=self.fm, label='End 1',
+            field_type='dynamic_forms.formfields.EndGroupField', position=6)
+        FormFieldModel.objects.create(parent_form=self.fm, label='End 2',
+            field_type='dynamic_forms.formfields.EndGroupField', position=7)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Outside',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=8)
+        schema = FormSchema.from_form_model(self.fm)
+
+        self.assertEqual([f.name for f in schema.form_fields],
+            ['label-1', 'label-2', 'mail', 'outside'])
+        self.assertEqual([f.name for f in schema.data_fields],
+            ['label-1', 'label-2', 'mail', 'outside'])
+        self.assertEqual([g.name for g in schema.groups], ['group', 'inner'])
+
+        group, outside = schema.tree
+        self.assertIs(outside, schema.get_field('outside'))
+        self.assertIsNone(outside.group)
+        self.assertEqual(group.label, 'Group')
+        self.assertEqual([getattr(c, 'name') for c in group.children],
+            ['label-1', 'label-2', 'inner'])
+        inner = schema.get_group('inner')
+        self.assertIs(inner.parent, group)
+        self.assertEqual(schema.get_field('mail').group, 'inner')
+        self.assertEqual([f.name for f in group.iter_fields()],
+            ['label-1', 'label-2', 'mail'])
+        self.assertRaises(KeyError, schema.get_group, 'label-1')
+
+    def test_cached(self):
+        schema = get_form_schema(self.fm)
+        with self.assertNumQueries(0):
+            self.assertIs(get_form_schema(self.fm), schema)
+            form = FormModelForm(model=self.fm)
+        self.assertEqual(list(form.fields), ['label-1', 'label-2'])
+
+    def test_invalidate_on_field_change(self):
+        schema = get_form_schema(self.fm)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Label 3',
+            field_type='dynamic_forms.formfields.EmailField', position=4)
+        new_schema = get_form_schema(self.fm)
+        self.assertIsNot(new_schema, schema)
+        self.assertEqual(len(new_schema), 4)
+
+        FormFieldModel.objects.get(name='label-3').delete()
+        fm = FormModel.objects.get(pk=self.fm.pk)
+        self.assertEqual(len(get_form_schema(fm)), 3)
+
+    def test_invalidate_on_modified_at(self):
+        # A reused version number must not match the cached schema
+        schema = get_form_schema(self.fm)
+        fm = FormModel.objects.get(pk=self.fm.pk)
+        fm.schema_modified_at += datetime.timedelta(seconds=1)
+        self.assertIsNot(get_form_schema(fm), schema)
+
+    def test_invalidate_on_form_change(self):
+        schema = get_form_schema(self.fm)
+        self.fm.save()
+        self.assertIsNot(get_form_schema(self.fm), schema)
+
+
+class TestChoiceSet(TestCase):
+
+    def setUp(self):
+        clear_schema_cache()
+        self.choice_set = ChoiceSet.objects.create(name='Countries',
+            choices='Germany\nFrance\n\nItaly')
+        self.fm1 = FormModel.objects.create(name='Form 1')
+        self.fm2 = FormModel.objects.create(name='Form 2')
+        for fm in (self.fm1, self.fm2):
+            FormFieldModel.objects.create(parent_form=fm, label='Country',
+                field_type='dynamic_forms.formfields.ChoiceField',
+                choice_set=self.choice_set)
+
+    def test_shared(self):
+        field1 = get_form_schema(self.fm1).get_field('country')
+        field2 = get_form_schema(self.fm2).get_field('country')
+        self.assertIs(field1.choice_set, field2.choice_set)
+        self.assertEqual(field1.choice_set.values,
+            frozenset(['Germany', 'France', 'Italy']))
+
+        form = FormModelForm(model=self.fm1, data={'country': 'Italy'})
+        self.assertTrue(form.is_valid())
+        form = FormModelForm(model=self.fm2, data={'country': 'Spain'})
+        self.assertFalse(form.is_valid())
+
+    def test_update(self):
+        compiled = get_form_schema(self.fm1).get_field('country').choice_set
+        version = FormModel.objects.get(pk=self.fm1.pk).schema_version
+
+        self.choice_set.choices = 'Spain'
+        self.choice_set.save()
+        self.assertEqual(self.choice_set.version, 2)
+
+        fm1 = FormModel.objects.get(pk=self.fm1.pk)
+        self.assertEqual(fm1.schema_version, version + 1)
+        new_compiled = get_form_schema(fm1).get_field('country').choice_set
+        self.assertIsNot(new_compiled, compiled)
+        self.assertEqual(new_compiled.values, frozenset(['Spain']))
+
+    def test_stale_save(self):
+        stale = ChoiceSet.objects.get(pk=self.choice_set.pk)
+        self.choice_set.save()
+        self.choice_set.save()
+        stale.save()
+        self.assertEqual(stale.version, 4)
+        self.assertEqual(ChoiceSet.objects.get(pk=stale.pk).version, 4)
+
+
+def assert_plain(test, value):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            assert_plain(test, k)
+            assert_plain(test, v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            assert_plain(test, v)
+    else:
+        test.assertIsInstance(value, six.string_types + six.integer_types
+            + (float, bool, type(None), datetime.datetime))
+
+
+class TestSchemaSerialization(TestCase):
+
+    def setUp(self):
+        clear_schema_cache()
+        self.choice_set = ChoiceSet.objects.create(name='Countries',
+            choices='Germany\nFrance')
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=2, _options='{"required": false, "max_length": 10}')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Country',
+            field_type='dynamic_forms.formfields.ChoiceField',
+            position=3, choice_set=self.choice_set)
+
+    def test_plain_state(self):
+        schema = FormSchema.from_form_model(self.fm)
+        schema.get_form_class()
+        state = schema.__getstate__()
+        assert_plain(self, state)
+        self.assertEqual(state['version'], self.fm.schema_version)
+        self.assertEqual(state['fields'][2]['choice_set_ref'],
+            (self.choice_set.pk, 1))
+
+    def test_pickle(self):
+        schema = FormSchema.from_form_model(self.fm)
+        compiled = get_compiled_choice_set(self.choice_set)
+        with self.assertNumQueries(0):
+            loaded = pickle.loads(pickle.dumps(schema, -1))
+        self.assertEqual([(f.name, f.group, f.options) for f in loaded],
+            [(f.name, f.group, f.options) for f in schema])
+        self.assertIs(loaded.get_field('country').choice_set, compiled)
+
+        form = loaded.get_form_class()(model=self.fm,
+            data={'name': 'Jane', 'country': 'France'})
+        self.assertTrue(form.is_valid())
+
+    def test_pickle_loads_choice_set(self):
+        data = pickle.dumps(FormSchema.from_form_model(self.fm), -1)
+        clear_schema_cache()
+        with self.assertNumQueries(1):
+            loaded = pickle.loads(data)
+        self.assertEqual(loaded.get_field('country').choice_set.values,
+            frozenset(['Germany', 'France']))
+
+    def assert_shared(self):
+        get_cache().clear()
+        schema = get_form_schema(self.fm)
+        # Simulate another node with empty in-process caches
+        clear_schema_cache()
+        # Only the choice set is loaded from the database
+        with self.assertNumQueries(1):
+            other = get_form_schema(self.fm)
+        self.assertIsNot(other, schema)
+        self.assertEqual(other.__getstate__(), schema.__getstate__())
+
+        # A new version is stored under a new key
+        self.fm.save()
+        self.assertEqual(get_form_schema(self.fm).version,
+            schema.version + 1)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dynamic_forms_tests',
+    }})
+    def test_locmem_backend(self):
+        self.assert_shared()
+
+    def test_filebased_backend(self):
+        path = tempfile.mkdtemp()
+        try:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': path,
+            }}):
+                self.assert_shared()
+        finally:
+            shutil.rmtree(path)
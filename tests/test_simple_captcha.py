@@ -8,13 +8,15 @@ from django.test import TestCase
 from django.utils.encoding import force_text
 
 from dynamic_forms.formfields import formfield_registry as registry
+from dynamic_forms.forms import FormModelForm
 from dynamic_forms.models import FormFieldModel, FormModel, FormModelData
 
 
 class TestSimpleCaptcha(TestCase):
 
     def setUp(self):
-        from dynamic_forms.contrib.simple_captcha.models import CaptchaField  # noqa
+        from dynamic_forms.contrib.simple_captcha.models import CaptchaField
+        registry.register(CaptchaField)
         self.captcha_key = 'dynamic_forms.contrib.simple_captcha.models.CaptchaField'
 
     def tearDown(self):
@@ -47,3 +49,12 @@ class TestSimpleCaptcha(TestCase):
         self.assertRedirects(response, '/done/')
         data = FormModelData.objects.get()
         self.assertEqual(data.value, '{"Field 1": "Some value"}')
+
+    def test_new_challenge_per_render(self):
+        fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=fm,
+            field_type=self.captcha_key, label='CAPTCHA', position=1)
+        regex = r'value="([0-9a-f]{40})"'
+        hash1 = re.findall(regex, FormModelForm(model=fm).as_p())[0]
+        hash2 = re.findall(regex, FormModelForm(model=fm).as_p())[0]
+        self.assertNotEqual(hash1, hash2)
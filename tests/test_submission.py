@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core import mail
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from dynamic_forms.actions import action_registry
+from dynamic_forms.cache import form_model_cache, get_form_model
+from dynamic_forms.models import FormFieldModel, FormModel, FormModelData
+from dynamic_forms.schema import clear_schema_cache, get_form_schema
+from dynamic_forms.submission import SubmissionContext, submit_batch
+
+
+def context_action(context):
+    context_action.calls.append(context)
+    return [f.name for f in context.fields]
+
+
+context_action.calls = []
+
+
+def short_batch_action(context):
+    return None
+
+
+def short_batch(context, forms):
+    return [None] * (len(forms) - 1)
+
+
+@override_settings(DYNAMIC_FORMS_EMAIL_RECIPIENTS=['mail@example.com'])
+class TestSubmissionContext(TestCase):
+
+    def setUp(self):
+        clear_schema_cache()
+        form_model_cache.clear()
+        action_registry.register(context_action, 'Context action',
+            takes_context=True)
+        self.fm = FormModel.objects.create(name='Form', allow_display=True,
+            actions=['dynamic_forms.actions.dynamic_form_send_email',
+                     'dynamic_forms.actions.dynamic_form_store_database'])
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField',
+            position=2, _options='{"required": false}')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField',
+            position=3)
+        FormFieldModel.objects.create(parent_form=self.fm, label='End',
+            field_type='dynamic_forms.formfields.EndGroupField',
+            position=4, _options='{"required": false}')
+        self.url = '/dynamic_forms/forms/%d/' % self.fm.pk
+        self.data = {'name': 'Some name', 'mail': 'mail@example.com'}
+
+    def tearDown(self):
+        context_action.calls = []
+        action_registry.unregister('tests.test_submission.context_action')
+
+    def test_load(self):
+        context = SubmissionContext.load(self.fm.pk)
+        self.assertEqual(context.form_model, self.fm)
+        self.assertEqual([f.name for f in context.fields],
+            ['name', 'group', 'mail', 'end'])
+        self.assertRaises(FormModel.DoesNotExist, SubmissionContext.load,
+            self.fm.pk + 1)
+
+    def test_run_actions(self):
+        self.fm.actions = ['tests.test_submission.context_action']
+        self.fm.save()
+        context = SubmissionContext.load(self.fm.pk)
+        form = context.get_form(data=self.data)
+        self.assertTrue(form.is_valid())
+        results = context.run_actions()
+        self.assertEqual(context_action.calls, [context])
+        self.assertEqual(results, {
+            'tests.test_submission.context_action': [
+                'name', 'group', 'mail', 'end'],
+        })
+
+    def test_query_budget(self):
+        # Warm the caches, e.g. by a previous GET
+        get_form_schema(get_form_model(self.fm.pk))
+        # 1 query to check the uniqueness of the generated display key and 3
+        # for the savepoint around the INSERT of the stored data.
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FormModelData.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_query_budget_cold(self):
+        # 1 query to load the form model, 1 to load its fields and the 4
+        # queries of the store action.
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FormModelData.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_submit_batch(self):
+        get_form_schema(get_form_model(self.fm.pk))
+        items = [
+            self.data,
+            {'name': 'Other name', 'mail': 'invalid'},
+            {'name': 'Third name', 'mail': 'third@example.com'},
+        ]
+        # 1 query to check the uniqueness of the display keys, 1 INSERT and 1
+        # query for the primary keys, inside a savepoint
+        with self.assertNumQueries(5):
+            results = submit_batch(get_form_model(self.fm.pk), items)
+        self.assertEqual([form.is_valid() for form, r in results],
+            [True, False, True])
+        self.assertIsNone(results[1][1])
+        self.assertEqual(list(results[1][0].errors), ['mail'])
+
+        key = 'dynamic_forms.actions.dynamic_form_store_database'
+        stored = [r[key] for form, r in results if r is not None]
+        self.assertEqual(len(set(d.display_key for d in stored)), 2)
+        self.assertEqual(
+            sorted(FormModelData.objects.values_list('display_key', 'pk')),
+            sorted((d.display_key, d.pk) for d in stored))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_submit_batch_not_displayed(self):
+        self.fm.allow_display = False
+        self.fm.save()
+        results = submit_batch(get_form_model(self.fm.pk),
+            [self.data, self.data])
+        key = 'dynamic_forms.actions.dynamic_form_store_database'
+        self.assertEqual(
+            sorted(FormModelData.objects.values_list('pk', flat=True)),
+            sorted(r[key].pk for form, r in results))
+
+    def test_run_batch_actions(self):
+        self.fm.actions = ['tests.test_submission.context_action']
+        self.fm.save()
+        context = SubmissionContext.load(self.fm.pk)
+        results = context.submit_batch([self.data, self.data])
+        self.assertEqual(len(context_action.calls), 2)
+        self.assertEqual([r for form, r in results], [{
+            'tests.test_submission.context_action': [
+                'name', 'group', 'mail', 'end'],
+        }] * 2)
+
+    def test_run_batch_actions_wrong_length(self):
+        action_registry.register(short_batch_action, 'Short batch',
+            takes_context=True, batch=short_batch)
+        try:
+            self.fm.actions = [
+                'dynamic_forms.actions.dynamic_form_send_email',
+                'dynamic_forms.actions.dynamic_form_store_database',
+                'tests.test_submission.short_batch_action',
+            ]
+            self.fm.save()
+            context = SubmissionContext.load(self.fm.pk)
+            self.assertRaises(ValueError, context.submit_batch,
+                [self.data, self.data])
+            # The data sets are rolled back and the mails are sent last
+            self.assertFalse(FormModelData.objects.exists())
+            self.assertEqual(len(mail.outbox), 0)
+        finally:
+            action_registry.unregister(
+                'tests.test_submission.short_batch_action')
@@ -3,17 +3,28 @@ from __future__ import unicode_literals
 
 import datetime
 import json
+import re
+import time
 from collections import OrderedDict
 
-from django.test import TestCase
+import six
+from django.http import StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase
 from django.test.utils import override_settings
+from django.utils import translation
 from django.utils.decorators import classonlymethod
+from django.utils.http import http_date
 
 from .utils import CEST
 
 from dynamic_forms.actions import action_registry
+from dynamic_forms.cache import form_model_cache, get_cache
 from dynamic_forms.forms import FormModelForm
+from dynamic_forms.fragments import (
+    CSRF_TOKEN_PLACEHOLDER, get_fragment_cache_key,
+)
 from dynamic_forms.models import FormFieldModel, FormModel, FormModelData
+from dynamic_forms.views import DynamicFormView, StreamingDynamicFormView
 
 
 class TestAction(object):
@@ -282,3 +293,474 @@ class TestViews(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'dynamic_forms/data_set_404.html')
+
+
+class TestChoiceLookup(TestCase):
+
+    def setUp(self):
+        self.fm = FormModel.objects.create(name='Form')
+        choices = '\n'.join('Choice %03d' % i for i in range(50))
+        FormFieldModel.objects.create(parent_form=self.fm, label='Big',
+            field_type='dynamic_forms.formfields.AutocompleteChoiceField',
+            _options=json.dumps({'choices': choices + '\nOther'}))
+        FormFieldModel.objects.create(parent_form=self.fm, label='Small',
+            field_type='dynamic_forms.formfields.ChoiceField',
+            _options=json.dumps({'choices': 'a\nb'}))
+        self.url = '/dynamic_forms/forms/%d/choices/big/' % self.fm.pk
+
+    def test_widget(self):
+        form = FormModelForm(model=self.fm)
+        html = six.text_type(form['big'])
+        self.assertIn('data-autocomplete-url="%s"' % self.url, html)
+        self.assertNotIn('Choice 001', html)
+
+    def test_lookup(self):
+        response = self.client.get(self.url, {'q': 'choice 04'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['more'], False)
+        self.assertEqual([r['value'] for r in data['results']],
+            ['Choice %03d' % i for i in range(40, 50)])
+
+    @override_settings(DYNAMIC_FORMS_AUTOCOMPLETE_PAGE_SIZE=20)
+    def test_lookup_pages(self):
+        response = self.client.get(self.url, {'q': 'Ch', 'page': 3})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['more'], False)
+        self.assertEqual(data['results'][0],
+            {'value': 'Choice 040', 'label': 'Choice 040'})
+        self.assertEqual(len(data['results']), 10)
+
+        response = self.client.get(self.url, {'q': 'Ch', 'page': 2})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['more'], True)
+        self.assertEqual(len(data['results']), 20)
+
+    def test_validation(self):
+        form = FormModelForm(model=self.fm,
+            data={'big': 'Other', 'small': 'a'})
+        self.assertTrue(form.is_valid())
+        form = FormModelForm(model=self.fm,
+            data={'big': 'Missing', 'small': 'a'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('big', form.errors)
+
+    def test_lookup_404(self):
+        url = '/dynamic_forms/forms/%d/choices/small/' % self.fm.pk
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = '/dynamic_forms/forms/%d/choices/missing/' % self.fm.pk
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.fm.display = False
+        self.fm.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=60)
+class TestFragmentCache(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.url = '/dynamic_forms/forms/%d/' % self.fm.pk
+
+    def get_token(self, response):
+        return re.findall(r"name='csrfmiddlewaretoken' value='([^']+)'",
+            response.content.decode('utf-8'))
+
+    def test_cached(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="name"')
+        token = response.cookies['csrftoken'].value
+        self.assertEqual(self.get_token(response), [token])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(self.get_token(response), [token])
+
+    def test_token_per_client(self):
+        self.client.get(self.url)
+        other = Client()
+        response = other.get(self.url)
+        token = response.cookies['csrftoken'].value
+        self.assertNotEqual(token, self.client.cookies['csrftoken'].value)
+        self.assertEqual(self.get_token(response), [token])
+        self.assertNotContains(response, CSRF_TOKEN_PLACEHOLDER)
+
+    def test_invalidated(self):
+        self.client.get(self.url)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField')
+        self.assertContains(self.client.get(self.url), 'name="mail"')
+
+    def test_language(self):
+        self.client.get(self.url)
+        with translation.override('de'):
+            key = get_fragment_cache_key(self.fm, 'dynamic_forms/form.html')
+        self.assertIsNone(get_cache().get(key))
+        key = get_fragment_cache_key(self.fm, 'dynamic_forms/form.html')
+        self.assertIsNotNone(get_cache().get(key))
+
+    @override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        response = self.client.get(self.url)
+        token = response.cookies['csrftoken'].value
+        self.assertEqual(self.get_token(response), [token])
+        key = get_fragment_cache_key(self.fm, 'dynamic_forms/form.html')
+        self.assertIsNone(get_cache().get(key))
+
+
+class TestConditionalGet(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form', allow_display=True)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.url = '/dynamic_forms/forms/%d/' % self.fm.pk
+
+    def test_form(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        FormFieldModel.objects.create(parent_form=self.fm, label='Mail',
+            field_type='dynamic_forms.formfields.EmailField')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="mail"')
+
+    def test_form_csrf_cookie(self):
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        other = Client()
+        other.get(self.url)
+        response = other.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_form_pending_messages(self):
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.post(self.url, {'name': 'Name'})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_form_if_modified_since(self):
+        # The page depends on more than the schema, so a date is not enough
+        response = self.client.get(self.url,
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_form_fragment_cache(self):
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_data_set(self):
+        fmd = FormModelData.objects.create(form=self.fm, value='{}')
+        url = '/dynamic_forms/show/%s/' % fmd.display_key
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url,
+            HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/dynamic_forms/show/%s/' % ('0' * 24),
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestStreamingForm(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form')
+        for i in range(3):
+            FormFieldModel.objects.create(parent_form=self.fm,
+                label='Field %d' % i, position=i,
+                field_type='dynamic_forms.formfields.SingleLineTextField')
+
+    def get(self, view):
+        request = RequestFactory().get('/dynamic_forms/forms/%d/' % self.fm.pk)
+        request.META['CSRF_COOKIE'] = 'a' * 32
+        return view.as_view()(request, form_id=str(self.fm.pk))
+
+    def test_stream(self):
+        response = self.get(StreamingDynamicFormView)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 3)
+        reference = self.get(DynamicFormView)
+        reference.render()
+        self.assertEqual(b''.join(chunks), reference.content)
+
+    def test_url(self):
+        response = self.client.get(
+            '/dynamic_forms/forms/%d/stream/' % self.fm.pk)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn(b'name="field-2"', b''.join(response.streaming_content))
+
+    @override_settings(DYNAMIC_FORMS_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_fragment_cache(self):
+        response = self.get(StreamingDynamicFormView)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+        self.assertContains(response, 'name="field-2"')
+
+
+class TestFormSchemaView(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form')
+        FormFieldModel.objects.create(parent_form=self.fm, label='Group',
+            field_type='dynamic_forms.formfields.StartGroupField', position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Color',
+            field_type='dynamic_forms.formfields.ChoiceField', position=2,
+            _options=json.dumps({'choices': 'red\nblue'}))
+        FormFieldModel.objects.create(parent_form=self.fm, label='End',
+            field_type='dynamic_forms.formfields.EndGroupField', position=3)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=4)
+        self.url = '/dynamic_forms/forms/%d/schema.json' % self.fm.pk
+
+    def test_schema(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+            'application/json; charset=utf-8')
+        data = json.loads(response.content.decode('utf-8'))
+        fm = FormModel.objects.get(pk=self.fm.pk)
+        self.assertEqual(data['id'], fm.pk)
+        self.assertEqual(data['version'], fm.schema_version)
+        self.assertEqual([f['name'] for f in data['fields']],
+            ['group', 'color', 'end', 'name'])
+        self.assertEqual(data['fields'][1]['choices'], ['red', 'blue'])
+        self.assertNotIn('choices', data['fields'][1]['options'])
+        self.assertEqual(data['fields'][1]['rules'], {'required': True})
+        self.assertEqual(data['fields'][1]['group'], 'group')
+        self.assertEqual(data['tree'], [{'name': 'group', 'label': 'Group',
+            'help_text': '', 'children': ['color']}, 'name'])
+
+    def test_autocomplete(self):
+        FormFieldModel.objects.create(parent_form=self.fm, label='City',
+            field_type='dynamic_forms.formfields.AutocompleteChoiceField',
+            position=5, _options=json.dumps({'choices': 'Berlin\nParis'}))
+        response = self.client.get(self.url)
+        field = json.loads(response.content.decode('utf-8'))['fields'][4]
+        self.assertEqual(field['name'], 'city')
+        self.assertNotIn('choices', field)
+        self.assertNotIn('choices', field['options'])
+        self.assertNotIn('Berlin', response.content.decode('utf-8'))
+
+    def test_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        version = FormModel.objects.get(pk=self.fm.pk).schema_version
+        response = self.client.get(self.url, {'version': version})
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        self.fm.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(self.url, {'version': version})
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+    def test_not_displayed(self):
+        self.fm.display = False
+        self.fm.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(
+            '/dynamic_forms/forms/0/schema.json').status_code, 404)
+
+
+def get_csrf_token(client):
+    response = client.get('/dynamic_forms/csrf-token.json')
+    return json.loads(response.content.decode('utf-8'))['csrf_token']
+
+
+class TestCsrfToken(TestCase):
+
+    def setUp(self):
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form',
+            actions=['dynamic_forms.actions.dynamic_form_store_database'])
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_token(self):
+        response = self.client.get('/dynamic_forms/csrf-token.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=0', response['Cache-Control'])
+        token = json.loads(response.content.decode('utf-8'))['csrf_token']
+        self.assertEqual(self.client.cookies['csrftoken'].value, token)
+
+    def test_submit_prerendered_form(self):
+        url = '/dynamic_forms/forms/%d/' % self.fm.pk
+        self.assertEqual(self.client.post(url, {'name': 'Jane'}).status_code,
+            403)
+        response = self.client.get('/dynamic_forms/csrf-token.json')
+        token = json.loads(response.content.decode('utf-8'))['csrf_token']
+        response = self.client.post(url, {'name': 'Jane',
+            'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(FormModelData.objects.exists())
+
+
+class TestSubmitJson(TestCase):
+
+    def setUp(self):
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form',
+            actions=['dynamic_forms.actions.dynamic_form_store_database'])
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField',
+            position=1)
+        FormFieldModel.objects.create(parent_form=self.fm, label='Count',
+            field_type='dynamic_forms.formfields.IntegerField', position=2,
+            _options='{"required": false}')
+        self.url = '/dynamic_forms/forms/%d/submit.json' % self.fm.pk
+        self.client = Client(enforce_csrf_checks=True)
+        self.token = get_csrf_token(self.client)
+
+    def post(self, data, content_type='application/json', token=True):
+        if not isinstance(data, six.string_types):
+            data = json.dumps(data)
+        headers = {'HTTP_X_CSRFTOKEN': self.token} if token else {}
+        return self.client.post(self.url, data, content_type=content_type,
+            **headers)
+
+    def test_no_content(self):
+        response = self.post({'name': 'Jane', 'count': 3})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b'')
+        data = FormModelData.objects.get()
+        self.assertEqual(json.loads(data.value), {'Name': 'Jane', 'Count': 3})
+
+    def test_created(self):
+        self.fm.allow_display = True
+        self.fm.save()
+        response = self.post({'name': 'Jane'})
+        self.assertEqual(response.status_code, 201)
+        data = FormModelData.objects.get()
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+            {'display_key': data.display_key})
+        self.assertTrue(response['Location'].endswith(
+            '/dynamic_forms/show/%s/' % data.display_key))
+
+    def test_invalid(self):
+        response = self.post({'count': 'many'})
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.content.decode('utf-8'))['errors']
+        self.assertEqual(sorted(errors), ['count', 'name'])
+        self.assertEqual(len(errors['name']), 1)
+        self.assertFalse(FormModelData.objects.exists())
+
+    def test_bad_request(self):
+        for body in ('not json', '[1, 2]'):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('__all__', json.loads(
+                response.content.decode('utf-8'))['errors'])
+        response = self.post('name=Jane',
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_not_displayed(self):
+        self.fm.display = False
+        self.fm.save()
+        self.assertEqual(self.post({'name': 'Jane'}).status_code, 404)
+
+    def test_csrf(self):
+        self.assertEqual(self.post({'name': 'Jane'}, token=False).status_code,
+            403)
+        self.assertFalse(FormModelData.objects.exists())
+
+    @override_settings(DYNAMIC_FORMS_JSON_CSRF_EXEMPT=True)
+    def test_csrf_exempt(self):
+        self.assertEqual(self.post({'name': 'Jane'}, token=False).status_code,
+            204)
+
+
+class TestSubmitBatchJson(TestCase):
+
+    def setUp(self):
+        form_model_cache.clear()
+        self.fm = FormModel.objects.create(name='Form', allow_display=True,
+            actions=['dynamic_forms.actions.dynamic_form_store_database'])
+        FormFieldModel.objects.create(parent_form=self.fm, label='Name',
+            field_type='dynamic_forms.formfields.SingleLineTextField')
+        self.url = '/dynamic_forms/forms/%d/batch.json' % self.fm.pk
+        self.client = Client(enforce_csrf_checks=True)
+        self.token = get_csrf_token(self.client)
+
+    def post(self, data, token=True):
+        headers = {'HTTP_X_CSRFTOKEN': self.token} if token else {}
+        return self.client.post(self.url, json.dumps(data),
+            content_type='application/json', **headers)
+
+    def test_csrf(self):
+        self.assertEqual(self.post([{'name': 'Jane'}], token=False).status_code,
+            403)
+        self.assertFalse(FormModelData.objects.exists())
+
+    def test_batch(self):
+        response = self.post([{'name': 'Jane'}, {'name': ''}, 'x',
+            {'name': 'John'}])
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content.decode('utf-8'))['results']
+        self.assertEqual([r['status'] for r in results], [201, 400, 400, 201])
+        self.assertEqual(list(results[1]['errors']), ['name'])
+        self.assertEqual(list(results[2]['errors']), ['__all__'])
+        self.assertEqual(
+            sorted(FormModelData.objects.values_list('display_key',
+                flat=True)),
+            sorted([results[0]['display_key'], results[3]['display_key']]))
+
+    def test_no_content(self):
+        self.fm.allow_display = False
+        self.fm.save()
+        results = json.loads(self.post([{'name': 'Jane'}]).content.decode(
+            'utf-8'))['results']
+        self.assertEqual(results, [{'status': 204}])
+        self.assertIsNone(FormModelData.objects.get().display_key)
+
+    @override_settings(DYNAMIC_FORMS_BATCH_MAX_SIZE=2)
+    def test_too_large(self):
+        self.assertEqual(self.post([{'name': 'Jane'}] * 3).status_code, 413)
+        self.assertEqual(self.post({'name': 'Jane'}).status_code, 400)
+        self.assertFalse(FormModelData.objects.exists())
@@ -1,3 +1,9 @@
 from django.utils.timezone import FixedOffset
 
+from dynamic_forms.formfields import BaseDynamicFormField
+
 CEST = FixedOffset(offset=120, name='Europe/Berlin')
+
+
+class BrokenField(BaseDynamicFormField):
+    cls = 'django.forms.fields.DoesNotExistField'